@@ -1,13 +1,16 @@
 import streamlit as st
 from streamlit_carousel import carousel
 
+from phite import metrics
 
-st.set_page_config(layout="wide")
 
-st.write("# Welcome to the PHITE Trancriptome!")
+def app():
+    st.set_page_config(layout="wide")
 
-st.markdown(
-    """
+    st.write("# Welcome to the PHITE Trancriptome!")
+
+    st.markdown(
+        """
     <div style="
         font-family: 'Source Sans Pro', sans-serif; 
         font-size: 18px; 
@@ -26,28 +29,29 @@ st.markdown(
       </ul>
     </div>
     """,
-    unsafe_allow_html=True
-)
+        unsafe_allow_html=True
+    )
 
 
-items = [
-    dict(
-        title="",
-        text="",
-        img="folddemo.png",
-    ),
-    dict(
-        title="",
-        text="",
-        img="vo2demo.png",
-    ),
-]
-carousel(items=items, controls=False, interval=5000)
+    items = [
+        dict(
+            title="",
+            text="",
+            img="folddemo.png",
+        ),
+        dict(
+            title="",
+            text="",
+            img="vo2demo.png",
+        ),
+    ]
+    with metrics.timer("carousel"):
+        carousel(items=items, controls=False, interval=5000)
 
-col1, col2 = st.columns(2)
-with col1:
-    st.markdown(
-        """
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(
+            """
         <div style="
             font-family: 'Source Sans Pro', sans-serif; 
             font-size: 18px; 
@@ -58,14 +62,14 @@ with col1:
           </center> </p>
         </div>
         """,
-        unsafe_allow_html=True
-    )
-    _, center, _ = st.columns([1, 3, 1])  # Creates three columns
-    with center:
-        st.image("onr_logo.png", width=800)
-with col2:
-    st.markdown(
-        """
+            unsafe_allow_html=True
+        )
+        _, center, _ = st.columns([1, 3, 1])  # Creates three columns
+        with center:
+            st.image("onr_logo.png", width=800)
+    with col2:
+        st.markdown(
+            """
         <div style="
             font-family: 'Source Sans Pro', sans-serif; 
             font-size: 18px; 
@@ -83,11 +87,11 @@ with col2:
           </center>
         </div>
         """,
-        unsafe_allow_html=True
-    )
+            unsafe_allow_html=True
+        )
 
-st.markdown(
-    """
+    st.markdown(
+        """
     <div style="
         font-family: 'Source Sans Pro', sans-serif; 
         font-size: 18px; 
@@ -115,5 +119,8 @@ st.markdown(
       </p>
     </div>
     """,
-    unsafe_allow_html=True
-)
+        unsafe_allow_html=True
+    )
+
+with metrics.page_run("home"):
+    app()
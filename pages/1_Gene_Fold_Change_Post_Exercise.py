@@ -1,31 +1,95 @@
 import pandas as pd
-import plotly.graph_objects as go
+import plotly.io as pio
 import streamlit as st
 
-st.set_page_config(layout="wide")
+from phite import artifacts, manifest, metrics, render
+from phite.figures import generateBar, generateCorrTable, generateStatsTable, generateTable
+from phite.loaders import MODEL_MANIFESTS, load_profiles
+from phite.lru import LRUCache
 
-timepoint_labels = {
-    "w0pre": "Week 0 Pre",
-    "w0h3": "Week 0 hour 3",
-    "w0h24": "Week 0 hour 24",
-    "w12pre": "Week 12 Pre",
-    "w12h3": "Week 12 hour 3",
-    "w12h24": "Week 12 hour 24",
-    "w16rest": "Week 16 Rest",
-}
+st.set_page_config(layout="wide")
 
-@st.cache_data
-def load_data():
-    return pd.read_csv(st.secrets["data_url"])
+PAYLOAD_CACHE_BYTES = 64 * 1024 * 1024
+EXPORT_POLL_SECONDS = 0.5
 
 @st.cache_data
-def load_stats():
-    return pd.read_csv(st.secrets["stats_url"])
-
+def model_targets():
+    return {name: manifest.load(path)["target"] for name, path in MODEL_MANIFESTS.items()}
+
+# one cache per process, shared by every session
+@st.cache_resource
+def payload_cache():
+    return LRUCache(max_bytes=PAYLOAD_CACHE_BYTES)
+
+def gene_payload(gene):
+    # everything the page shows for a gene, or None if it has no fold change data
+    def build():
+        with metrics.timer("load_profiles"):
+            profiles = load_profiles()
+        with metrics.timer("profile_lookup"):
+            gene_profile = profiles.lookup(gene)
+        if gene_profile is None or gene_profile["fold_change"] is None:
+            return None
+
+        with metrics.timer("build_stats_table"):
+            stats_table = corr_table = None
+            if gene_profile["stats"] is not None:
+                stats_table = generateStatsTable(gene_profile["stats"], gene).to_json()
+            if gene_profile["correlations"] is not None:
+                corr_table = generateCorrTable(gene_profile["correlations"], gene).to_json()
+
+        return {
+            "plot": gene_profile["fold_change"],
+            "stats_table": stats_table,
+            "corr_table": corr_table,
+            "models": gene_profile["models"],
+        }
+
+    return payload_cache().get_or_set(("gene", gene), build)
+
+def gene_figures(gene, cols_to_plot, payload, cache, cancelled=None):
+    # bar chart and table for one gene and one column selection, as figure JSON;
+    # runs in the background, so the payload cache is passed in by the script thread
+    def build():
+        plot_df = pd.DataFrame(payload["plot"])
+        plot_df = plot_df[plot_df["comparison"].isin(cols_to_plot)]
+        with metrics.timer("build_figures"):
+            bar = generateBar(plot_df, gene).to_json()
+            render.check(cancelled)
+            return {"bar": bar, "table": generateTable(plot_df, gene).to_json()}
+
+    return cache.get_or_set(("figures", gene, tuple(cols_to_plot)), build)
+
+def export_images(gene, cols_to_plot, payload, cache, cancelled=None):
+    # kaleido export of the bar chart, run in the background by render.TaskGroup
+    fig = pio.from_json(gene_figures(gene, cols_to_plot, payload, cache, cancelled)["bar"])
+    with metrics.timer("kaleido_export"):
+        render.check(cancelled)
+        png = fig.to_image(format="png", engine="kaleido")
+        render.check(cancelled)
+        return png, fig.to_image(format="pdf", engine="kaleido")
+
+# reruns on its own while kaleido works, so neither the click nor the rest of
+# the page waits for the export; a full rerun shows the download buttons
+@st.fragment(run_every=EXPORT_POLL_SECONDS)
+def export_status(tasks):
+    future = tasks.futures.get("export")
+    if future is None or future.cancelled():
+        return
+    if not future.done():
+        st.caption("Preparing downloads...")
+        return
+    # drop the future too, it would otherwise keep the bytes alive
+    tasks.futures.pop("export")
+    if artifacts.put(st.session_state, "figure_export", future.result()) is None:
+        st.session_state.export_error = (
+            f"The images are larger than the {artifacts.SESSION_MAX_BYTES / 2 ** 20:.0f} MB a session can "
+            "keep for download. Select fewer columns and try again.")
+    else:
+        st.session_state.downloads_ready = True
+    st.rerun()
 
 def app():
-    df = load_data()
-
     tabs_font_css = """
     <style>
     div[class*="stTextInput"] label p {
@@ -44,19 +108,18 @@ def app():
 
     if gene_input:
         gene_input = gene_input.strip().upper()
-        if gene_input not in df["genesymbol"].values:
+        payload = gene_payload(gene_input)
+        if payload is None:
             st.error(f"{gene_input} expression not detected. Please try again.")
         else:
             st.success(f"Gene {gene_input} found!")
 
-            plot_df = process_df(gene_input, df)
-
             if "current_gene" not in st.session_state:
                 st.session_state.current_gene = gene_input
 
             cols_to_plot = st.multiselect(
                 "**Select columns to display:**",
-                options=plot_df["comparison"].values,  # exclude 'Gene' column
+                options=payload["plot"]["comparison"],
                 default=['w0h3_vs_w0pre', 'w0h24_vs_w0pre', 'w12pre_vs_w0pre',
                          'w12h3_vs_w0pre', 'w12h24_vs_w0pre', 'w16rest_vs_w0pre'],
             )
@@ -64,10 +127,19 @@ def app():
             if "cols_to_plot" not in st.session_state:
                 st.session_state.cols_to_plot = cols_to_plot
 
-            plot_df = plot_df[plot_df["comparison"].isin(cols_to_plot)]
+            # figures and exports run in the background, keyed by gene and columns so
+            # that changing either cancels whatever the previous run left queued
+            tasks = render.task_group(st.session_state, "fold_change_tasks", (gene_input, tuple(cols_to_plot)))
+            cache = payload_cache()
+            # finished figures are kept in the artifact store, not in the task group
+            figures = artifacts.get(st.session_state, "fold_change_figures")
+            if figures is not None and figures[0] == tasks.key:
+                figures = figures[1]
+            else:
+                figures = None
+                tasks.submit("figures", gene_figures, gene_input, cols_to_plot, payload, cache, tasks.cancelled)
 
-            fig = generateBar(plot_df, gene_input)
-            st.plotly_chart(fig, use_container_width=True)
+            bar_slot = st.empty()
 
             _, center, _ = st.columns([1, 2, 1])
 
@@ -75,18 +147,27 @@ def app():
                 st.session_state.downloads_ready = False
                 st.session_state.cols_to_plot = cols_to_plot
                 st.session_state.current_gene = gene_input
+                artifacts.discard(st.session_state, "figure_export")
+                st.session_state.pop("export_error", None)
+
+            # png and pdf bytes live in the shared artifact store; only the handle is
+            # kept per session, and an expired handle brings the button back
+            export = artifacts.get(st.session_state, "figure_export")
+            if export is None:
+                st.session_state.downloads_ready = False
 
             with center:
                 if not st.session_state.downloads_ready:
-                    if st.button("Generate Download"):
-                        st.session_state.downloads_ready = True
-                        st.session_state.figure_png = fig.to_image(format="png", engine="kaleido")
-                        st.session_state.figure_pdf = fig.to_image(format="pdf", engine="kaleido")
-                        st.rerun()
+                    if "export" not in tasks.futures and st.button("Generate Download"):
+                        st.session_state.pop("export_error", None)
+                        tasks.submit("export", export_images, gene_input, cols_to_plot, payload, cache,
+                                     tasks.cancelled)
+                    if "export" in tasks.futures:
+                        export_status(tasks)
+                    elif "export_error" in st.session_state:
+                        st.error(st.session_state.export_error)
                 else:
-                    # its already cached
-                    pdf_image = st.session_state.figure_pdf
-                    png_image = st.session_state.figure_png
+                    png_image, pdf_image = export
 
                     col1, col2 = st.columns(2)
 
@@ -111,189 +192,35 @@ def app():
             # for spacing
             st.write("##")
 
-            fig_table = generateTable(plot_df, gene_input)
-            st.plotly_chart(fig_table, use_container_width=True)
+            table_slot = st.empty()
 
-            stats_df = load_stats()
-            stats_df = stats_df.set_index("Unnamed: 0")
-
-            try:
-                stat_row = stats_df.loc[gene_input]
-                stat_table = generateStatsTable(stat_row, gene_input)
-                st.plotly_chart(stat_table, use_container_width=True)
-            except KeyError:
+            if payload["stats_table"] is None:
                 st.error(f"{gene_input} is not a valid gene for the statistics dataframe.")
-
-def process_df(gene, df):
-    g = df[df["genesymbol"] == gene].squeeze()
-    fc_cols = [c for c in df.columns if c.startswith("log2FC_")]
-    padj_cols = [c for c in df.columns if c.startswith("padj_")]
-
-    plot_df = pd.DataFrame({
-        "comparison": [c.replace("log2FC_", "") for c in fc_cols],
-        "log2FC": [g[c] for c in fc_cols],
-        "padj": [g[p] for p in padj_cols],
-    })
-    return plot_df
-
-def format_comparison_label(comp):
-    # Split into parts like "w0h3" and "w0pre"
-    parts = comp.split("_vs_")
-    if len(parts) != 2:
-        return comp  # fallback for unexpected cases
-
-    left, right = parts
-    global timepoint_labels
-    left_label = timepoint_labels.get(left, left)
-    right_label = timepoint_labels.get(right, right)
-
-    return f"{left_label} vs {right_label}"
-
-
-comparison_label_map = {
-    comp: format_comparison_label(comp)
-    for comp in [
-        'w0h3_vs_w0pre', 'w0h24_vs_w0pre', 'w12pre_vs_w0pre',
-        'w12h3_vs_w0pre', 'w12h24_vs_w0pre', 'w16rest_vs_w0pre',
-        'w12h3_vs_w12pre', 'w12h24_vs_w12pre', 'w16rest_vs_w12pre',
-        'w0h24_vs_w0h3', 'w12h24_vs_w12h3', 'w16rest_vs_w12h24'
-    ]
-}
-
-# Create base bar plot
-def generateBar(plot_df, gene):
-
-    colors = ["#d62728" if fc > 0 else "#1f77b4" for fc in plot_df["log2FC"]]
-
-    significance = []
-    for i, row in plot_df.iterrows():
-        # [0.05 - 0.01) *
-        # [0.01 - 0.001) **
-        # [0.001 - 0 ***)
-        if row["padj"] < 0.05:
-            if row["padj"] <= 0.001:
-                significance.append("***")
-            elif row["padj"] <= 0.01:
-                significance.append("**")
             else:
-                significance.append("*")
-        else:
-            significance.append(" ")
-
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=plot_df["comparison"],
-        y=plot_df["log2FC"],
-        name="",
-        showlegend=False,
-        hovertemplate="<b>%{x}</b><br>log2FC = %{y:.2f}<br>padj = %{customdata:.5f}",
-        customdata=plot_df["padj"],
-        marker_color=colors,
-        text=significance,
-        textfont=dict(
-            size=18,  # Set the desired font size
-            color='black',
-            family="Arial Black"
-        ),
-        textposition="outside"
-    ))
-
-    ymin, ymax = plot_df["log2FC"].min(), plot_df["log2FC"].max()
-    yrange = ymax - ymin
-    fig.update_yaxes(range=[ymin - 0.15 * yrange, ymax + 0.15 * yrange])
-
-    fig.update_layout(
-        title=f"Fold Change Across Time Points for {gene}",
-        xaxis_title="Timepoints",
-        yaxis_title="log2FC",
-        template="plotly_white",
-        showlegend=False
-    )
-
-    fig.update_xaxes(
-        ticktext=plot_df["comparison"],
-        tickvals=plot_df["comparison"],
-        tickfont=dict(size=12)
-    )
-    fig.update_xaxes(linewidth=2, linecolor='rgb(231, 234, 240)', mirror=True,
-                     showline=True)
-
-    fig.update_yaxes(linewidth=2, linecolor='rgb(231, 234, 240)', mirror=True,
-                     showline=True)
-
-    return fig
-
-def generateTable(plot_df, gene):
-    fig_table = go.Figure(
-        data=[go.Table(
-            header=dict(
-                values=["Time Points", "Fold Change (log2FC)", "Adjusted P-value"],
-                fill_color="#1f77b4",
-                align="center",  # horizontal center
-                font=dict(color="white", size=15)
-            ),
-            cells=dict(
-                values=[
-                    #[comparison_label_map.get(x, x) for x in plot_df["comparison"]],
-                    plot_df["comparison"],
-                    [f"{x:.2f}" for x in plot_df["log2FC"]],
-                    [f"{x:.2e}" for x in plot_df["padj"]]
-                ],
-                fill_color=[
-                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(plot_df))]
-                    for _ in range(3)  # one list per column
-                ],
-                align="center",  # horizontal center
-                font=dict(size=15),
-                height=30  # set row height for all cells
-            )
-        )]
-    )
-
-    fig_table.update_layout(
-        title=f"Fold Change and Adjusted P-values for {gene}",
-        template="plotly_white",
-        margin=dict(t=40, l=20, r=20, b=20)
-    )
-    return fig_table
-
-
-def generateStatsTable(df, gene):
-
-    stats_values = [
-        f"{df['mean']:.2f}",
-        f"{df['min']:.2f}",
-        f"{df['max']:.2f}",
-        f"{df['std']:.2f}",
-    ]
-    stats_labels = ["Mean", "Min", "Max", "Standard Deviation"]
-
-    fig_table = go.Figure(
-        data=[go.Table(
-            header=dict(
-                values=["Statistic", "Value"],
-                fill_color="#1f77b4",
-                align="center",
-                font=dict(color="white", size=15)
-            ),
-            cells=dict(
-                values=[stats_labels, stats_values],
-                fill_color=[
-                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(stats_labels))],
-                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(stats_values))]
-                ],
-                align="center",
-                font=dict(size=15),
-                height=30
-            )
-        )]
-    )
+                st.plotly_chart(pio.from_json(payload["stats_table"]), use_container_width=True)
+
+            if payload["corr_table"] is not None:
+                st.plotly_chart(pio.from_json(payload["corr_table"]), use_container_width=True)
+
+            if payload["models"]:
+                targets = model_targets()
+                names = " and ".join(targets[m] for m in payload["models"])
+                st.info(f"{gene_input} is one of the input genes of the {names} prediction model.")
+
+            if figures is None:
+                # polling keeps the script interruptible while the figures build
+                for _, future in tasks.as_completed(["figures"], poll=bar_slot.empty):
+                    figures = future.result()
+                    tasks.futures.pop("figures")
+                    artifacts.put(st.session_state, "fold_change_figures", (tasks.key, figures))
+            with metrics.timer("figure_from_json"):
+                fig = pio.from_json(figures["bar"])
+            bar_slot.plotly_chart(fig, use_container_width=True)
+            table_slot.plotly_chart(pio.from_json(figures["table"]), use_container_width=True)
+
+            metrics.cache_stats("payload", cache.stats())
+            artifacts.record_usage()
 
-    fig_table.update_layout(
-        title=f"Week 0 Baseline (w0pre) {gene} Expression",
-        template="plotly_white",
-        margin=dict(t=40, l=20, r=20, b=20)
-    )
-    return fig_table
 
-app()
+with metrics.page_run("fold_change"):
+    app()
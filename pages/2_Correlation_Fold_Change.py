@@ -1,19 +1,27 @@
-import pandas as pd
-import plotly.graph_objects as go
 import streamlit as st
 from streamlit_carousel import carousel
 
+from phite import corrstore, metrics
+from phite.figures import generateCorrTable
+from phite.loaders import load_profiles
+
 
 st.set_page_config(layout="wide")
 
-@st.cache_data
-def load_stats():
-    return pd.read_csv(st.secrets["corr_url"])
+TOP_GENES = 20
+
+# optional gene x gene correlations, memory-mapped once per process, see phite/corrstore.py
+@st.cache_resource
+def load_gene_correlations():
+    if "gene_corr_store" not in st.secrets:
+        return None
+    return corrstore.CorrStore(st.secrets["gene_corr_store"])
 
 
 def app():
-    df = load_stats()
-    df = df.set_index("Unnamed: 0")
+    # the correlations come from the gene-keyed profiles shared with page 1
+    with metrics.timer("load_profiles"):
+        profiles = load_profiles()
 
     tabs_font_css = """
     <style>
@@ -62,62 +70,28 @@ def app():
 
     if gene_input:
         gene_input = gene_input.strip().upper()
-        if gene_input not in df.index.values:
+        with metrics.timer("profile_lookup"):
+            gene_profile = profiles.lookup(gene_input)
+        if gene_profile is None or gene_profile["correlations"] is None:
             st.error(f"{gene_input} expression not detected. Please try again.")
         else:
             st.success(f"Gene {gene_input} found!")
 
-            plot_df = process_df(gene_input, df)
-
             if "current_gene" not in st.session_state:
                 st.session_state.current_gene = gene_input
 
-            fig_table = generateTable(plot_df, gene_input)
+            with metrics.timer("build_figures"):
+                fig_table = generateCorrTable(gene_profile["correlations"], gene_input)
             st.plotly_chart(fig_table, use_container_width=True)
 
+            gene_correlations = load_gene_correlations()
+            if gene_correlations is not None and gene_input in gene_correlations:
+                with metrics.timer("top_k"):
+                    top = gene_correlations.top_k(gene_input, TOP_GENES)
+                st.write(f"**Genes most correlated with {gene_input}** "
+                         f"(|r| ≥ {gene_correlations.meta['min_abs_r']:g})")
+                st.dataframe(top.rename(columns={"column": "gene"}), hide_index=True, use_container_width=True)
 
-def process_df(gene, df):
-    return df.loc[gene]
-
-def generateTable(df, gene):
-    metrics = {
-        "csa": "Myofibrils Size",
-        "torque": "Strength (Peak Torque)",
-        "contacts": "Vascular (contacts) Changes",
-        "vo2": "Vo2peak"
-    }
 
-    corr_values = [f"{df[f'{m}_corr']:+.2f}" for m in metrics]
-    p_values = [f"{df[f'{m}_p_val']:.3f}" for m in metrics]
-    corr_labels = [f"Correlation with {name}" for name in metrics.values()]
-
-    fig_table = go.Figure(
-        data=[go.Table(
-            header=dict(
-                values=["Statistic", "Correlation", "P-vals"],
-                fill_color="#1f77b4",
-                align="center",
-                font=dict(color="white", size=15)
-            ),
-            cells=dict(
-                values=[corr_labels, corr_values, p_values],
-                fill_color=[
-                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(corr_labels))],
-                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(corr_values))],
-                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(p_values))]
-                ],
-                align="center",
-                font=dict(size=15),
-                height=30
-            )
-        )]
-    )
-
-    fig_table.update_layout(
-        title=f"Various Correlations for {gene}",
-        template="plotly_white",
-        margin=dict(t=40, l=20, r=20, b=20)
-    )
-    return fig_table
-
-app()
+with metrics.page_run("correlation"):
+    app()
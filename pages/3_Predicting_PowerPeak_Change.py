@@ -1,27 +1,38 @@
+import functools
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import joblib
 import numpy as np
-import sklearn
+
+from phite import artifacts, cohort, datasets, manifest, metrics, serving
+from phite.figures import generateCohortDashboard
 
 # for reasons unknown to me, this prevents scrolling up
 st.markdown(
     "<span style='color:white;'>_</span>",
     unsafe_allow_html=True
 )
+# validation results and input genes of the shipped model, see phite/manifest.py
 @st.cache_data
+def load_manifest():
+    return manifest.load("power_predict.manifest.json")
+
+# compact NumPy export of power_predict.joblib, see phite/serving.py
+@st.cache_resource
 def load_model():
-    return joblib.load("power_predict.joblib")
+    return serving.load("power_predict.npz")
 
+# baseline stats of the model's input genes, read through the gene index, see phite/datasets.py
 @st.cache_data
-def load_stats():
-    return pd.read_csv(st.secrets["small_stats_url"])
+def load_gene_stats(genes):
+    return datasets.read_genes(st.secrets["small_stats_url"], genes, key="Unnamed: 0")
 
 def predict(gene_dict):
-    loaded_model = load_model()
-    df = pd.DataFrame([gene_dict], index=[0])
-    return (loaded_model.predict(df))[-1]
+    with metrics.timer("load_model"):
+        loaded_model = load_model()
+    with metrics.timer("model_predict"):
+        return (loaded_model.predict([gene_dict]))[-1]
 
 def render_result(col2, gene_dict):
     value = predict(gene_dict)
@@ -41,10 +52,11 @@ def render_result(col2, gene_dict):
         )
 
 def generate_random(mean, std, min_val, max_val):
-    val = round(np.random.normal(mean, std),2)
-    return str(np.clip(val, min_val, max_val))
+    # round after clipping: the bounds are float32, e.g. 13.996832847595215
+    val = np.clip(np.random.normal(mean, std), min_val, max_val)
+    return str(round(float(val), 2))
 
-def generate_figure(df_melted, display = True):
+def generate_figure(df_melted, r2, display = True):
     fig = px.scatter(
         df_melted,
         x="Person",
@@ -52,7 +64,8 @@ def generate_figure(df_melted, display = True):
         color="Type",
         color_discrete_map={"Predicted": "red", "Ground Truth": "blue"},
         symbol="Type",
-        symbol_map={"Predicted": "square", "Ground Truth": "circle"}
+        symbol_map={"Predicted": "square", "Ground Truth": "circle"},
+        render_mode="webgl"
     )
 
     fig.update_layout(
@@ -76,7 +89,7 @@ def generate_figure(df_melted, display = True):
                 y=0,  # bottom
                 xref="paper",
                 yref="paper",
-                text="R² = 0.483",
+                text=f"R² = {r2:.3f}",
                 showarrow=False,
                 font=dict(
                     family="Source Sans",
@@ -97,7 +110,7 @@ def generate_figure(df_melted, display = True):
 
     fig.update_traces(marker=dict(size=10))
 
-    if "power_value" in st.session_state and not display:
+    if not display and "power_value" in st.session_state:
         fig.add_scatter(
             x=[f"Your Prediction"],
             y=[round(st.session_state.power_value,2)],
@@ -111,52 +124,89 @@ def generate_figure(df_melted, display = True):
         )
     return fig
 
-st.set_page_config(layout="wide")
-
-predict_vals = [
-    0.005599743186, 1.298266617, 1.891041318, 0.7535308592, 1.16681347,
-    0.3959297206, 1.815427717, 1.882253625, 1.839312917, 3.049305107,
-    1.506710053, 1.780577201, 3.42148162, 3.23387687, 3.832846885, 3.417289455
-]
-
-target_vals = [
-    -2.607897982, 0.269361509, 0.503708835, 1.186004643, 1.195350356,
-    2.224511249, 2.435519798, 2.656927711, 2.700224126, 2.812167434,
-    3.045725237, 3.604506253, 4.125, 4.817310275, 4.916382253, 7.202941176
-]
-
-genes = [
-    'CCDC32', 'CDIN1', 'CHURC1', 'CYP4X1', 'ENSG00000235296', 'ENSG00000275202',
-    'ENSG00000284773', 'ENSG00000286970', 'EP400', 'FAM102A', 'GASK1A', 'GOLGA8J',
-    'HOMER1', 'IFT27', 'ITM2B', 'KCNIP3', 'KRBOX1', 'LARGE1', 'LINC00924', 'LRRC4B',
-    'LRRK1', 'MANEAL', 'NDUFB1', 'NECAP1', 'NOP2', 'PRKCH-AS1', 'PRKCSH', 'PRPF40A',
-    'PTPRC', 'PUM3', 'PXDNL', 'RFTN1', 'SCGB1D2', 'SLC38A7', 'SLC6A16', 'SNX7',
-    'VPS35L', 'ZNF570'
-]
-
-df = pd.DataFrame({
-    "Person": [f"Person {i+1}" for i in range(len(predict_vals))],
-    "Predicted": predict_vals,
-    "Ground Truth": target_vals
-})
-
-df_melted = df.melt(
-    id_vars="Person",
-    value_vars=["Predicted", "Ground Truth"],
-    var_name="Type",
-    value_name="PowerPeak change (W/kg)"
-)
+# the validation scatter is the same for every session, so it is built once per
+# process; the frame comes from the same manifest as r2, which keys the cache
+@st.cache_resource
+def validation_figure(_df_melted, r2):
+    with metrics.timer("build_figures"):
+        return generate_figure(_df_melted, r2)
+
+def render_cohort(validation):
+    # batch scoring; the dashboard is aggregated server-side, see phite/cohort.py
+    st.write("##")
+    st.markdown("#### Cohort predictions")
+    model = load_model()
+    source = st.radio("Cohort:", ["Upload a CSV", "Simulate from baseline expression"], horizontal=True,
+                      key="power_cohort_source")
 
-empty = st.empty()
+    score = None
+    if source == "Upload a CSV":
+        uploaded = st.file_uploader(
+            "One row per participant: an id column followed by one column per input gene", type="csv",
+            key="power_cohort_file")
+        if uploaded is not None and st.button("Score cohort", key="power_cohort_score"):
+            try:
+                score = cohort.read_inputs(uploaded, model.features)
+            except ValueError as e:
+                st.error(f"Could not read {uploaded.name}: {e}")
+    else:
+        n_rows = st.number_input("Participants:", min_value=10, max_value=cohort.MAX_ROWS, value=5000, step=1000,
+                                 key="power_cohort_rows")
+        if st.button("Score cohort", key="power_cohort_score"):
+            X = cohort.model_inputs(model.features, load_gene_stats(tuple(model.features)), n_rows, seed=int(np.random.randint(1 << 31)))
+            score = (np.array([f"Participant {i + 1}" for i in range(n_rows)], dtype=object), X)
 
-fig = generate_figure(df_melted=df_melted)
-with empty:
+    if score is not None:
+        with metrics.timer("batch_predict"):
+            stored = artifacts.put(st.session_state, "power_cohort", (score[0], cohort.predict(model, score[1])))
+        if stored is None:
+            st.error(f"{len(score[0]):,} predictions are more than a session can keep. Score a smaller cohort.")
+
+    scored = artifacts.get(st.session_state, "power_cohort")
+    if scored is None:
+        return
+    ids, predicted = scored
+    threshold = st.number_input("Responder threshold (W/kg):", value=0.0, step=0.1, key="power_cohort_threshold")
+    with metrics.timer("build_cohort_figures"):
+        summary = cohort.summarize(predicted, validation["predicted"], validation["observed"], threshold)
+        fig = generateCohortDashboard(summary, "PowerPeak change", "W/kg")
     st.plotly_chart(fig, use_container_width=True)
-col1, col2 = st.columns([2, 1])
+    st.download_button(
+        label=f"Download {len(ids):,} predictions (CSV)",
+        # built only when clicked, off the script thread
+        data=functools.partial(cohort.table_csv, ids, predicted, threshold),
+        file_name="power_cohort_predictions.csv",
+        mime="text/csv",
+    )
+
+def app():
+    st.set_page_config(layout="wide")
+
+    model_manifest = load_manifest()
+    predict_vals = model_manifest["validation"]["predicted"]
+    target_vals = model_manifest["validation"]["observed"]
+    genes = model_manifest["genes"]
 
-with col1:
-    st.markdown(
-        f"""
+    df = pd.DataFrame({
+        "Person": [f"Person {i+1}" for i in range(len(predict_vals))],
+        "Predicted": predict_vals,
+        "Ground Truth": target_vals
+    })
+
+    df_melted = df.melt(
+        id_vars="Person",
+        value_vars=["Predicted", "Ground Truth"],
+        var_name="Type",
+        value_name="PowerPeak change (W/kg)"
+    )
+
+    empty = st.empty()
+
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        st.markdown(
+            f"""
         <div style="margin-top:0px; font-size:18px; color:black;">
             <p>Insert normalized basal expression of each gene:</p>
             <span style="font-size:15px; color:grey;">
@@ -164,10 +214,10 @@ with col1:
             </span>
         </div>
         """,
-        unsafe_allow_html=True
-    )
-    st.markdown(
-        """
+            unsafe_allow_html=True
+        )
+        st.markdown(
+            """
         <style>
         /* Target the scroll-box container specifically */
         div[data-testid="stForm"] > div:nth-child(1) {
@@ -176,66 +226,87 @@ with col1:
         }
         </style>
         """,
-        unsafe_allow_html=True
-    )
+            unsafe_allow_html=True
+        )
+
+        with st.form("gene_input_form", clear_on_submit=False):
+            # All text inputs go here
+            gene_inputs = {}
+            if "power_gen_random" not in st.session_state:
+                st.session_state.power_gen_random = False
+
+            with metrics.timer("load_stats"):
+                df = load_gene_stats(tuple(genes))
+
+            # the generated values live in the shared artifact store, see phite/artifacts.py
+            random_gene_vals = artifacts.get(st.session_state, "power_random_gene_vals")
+            if st.session_state.power_gen_random and random_gene_vals is None:
+                if "power_random_gene_vals" in st.session_state:
+                    # the handle outlived its values; new ones would replace the set shown before
+                    artifacts.discard(st.session_state, "power_random_gene_vals")
+                    st.session_state.power_gen_random = False
+                    st.warning("The generated values expired after a period of inactivity. "
+                               "Click Generate Values for a new set.")
+                else:
+                    random_gene_vals = {}
+                    for g in genes:
+                        row_df = df.loc[g]
+                        random_gene_vals[g] = generate_random(
+                            row_df["mean"], row_df["std"], row_df["min"], row_df["max"]
+                        )
+                    artifacts.put(st.session_state, "power_random_gene_vals", random_gene_vals)
+
+            for g in genes:
+                if st.session_state.power_gen_random:
+                    gene_inputs[g] = st.text_input(g, value=random_gene_vals[g])
+
+                else:
+                    gene_inputs[g] = st.text_input(g, value="")
+
+            form1, form2, form3 = st.columns([1, 1, 1])
+
+            with form1:
+                submitted = st.form_submit_button("Submit")
+            with form2:
+                generate_syn = st.form_submit_button("Generate Values")
+            with form3:
+                remove_syn = st.form_submit_button("Remove Values")
+
+            if generate_syn:
+                st.session_state.power_gen_random = True
+                artifacts.discard(st.session_state, "power_random_gene_vals")
+                if "power_value" in st.session_state:
+                    st.session_state.pop("power_value")
+                st.rerun()
+
+            if remove_syn:
+                st.session_state.power_gen_random = False
+                artifacts.discard(st.session_state, "power_random_gene_vals")
+                if "power_value" in st.session_state:
+                    st.session_state.pop("power_value")
+                st.rerun()
+
+            if submitted:
+                if any(v.strip() == "" for v in gene_inputs.values()):
+                    st.error("Please fill in all gene values.")
+                else:
+                    st.success("Values successfully submitted!")
+                    gene_dict_float = {k: float(v) for k, v in gene_inputs.items()}
+                    render_result(col2, gene_dict_float)
+
+    if "power_value" in st.session_state:
+        with metrics.timer("build_figures"):
+            new_fig = generate_figure(df_melted, model_manifest["validation"]["r2"], display=False)
+        with empty:
+            st.plotly_chart(new_fig, use_container_width=True)
+    else:
+        with empty:
+            st.plotly_chart(validation_figure(df_melted, model_manifest["validation"]["r2"]),
+                            use_container_width=True)
+
+    render_cohort(model_manifest["validation"])
+
+    artifacts.record_usage()
 
-    with st.form("gene_input_form", clear_on_submit=False):
-        # All text inputs go here
-        gene_inputs = {}
-        if "power_gen_random" not in st.session_state:
-            st.session_state.power_gen_random = False
-
-        if "power_random_gene_vals" not in st.session_state:
-            st.session_state.power_random_gene_vals = {}  # store randoms here
-
-        df = load_stats()
-        df = df.set_index("Unnamed: 0")
-
-        for g in genes:
-            if st.session_state.power_gen_random:
-                if g not in st.session_state.power_random_gene_vals:
-                    # Generate only once per gene
-                    row_df = df.loc[g]
-                    st.session_state.power_random_gene_vals[g] = generate_random(
-                        row_df["mean"], row_df["std"], row_df["min"], row_df["max"]
-                    )
-                gene_inputs[g] = st.text_input(g, value=st.session_state.power_random_gene_vals[g])
-
-            else:
-                gene_inputs[g] = st.text_input(g, value="")
-
-        form1, form2, form3 = st.columns([1, 1, 1])
-
-        with form1:
-            submitted = st.form_submit_button("Submit")
-        with form2:
-            generate_syn = st.form_submit_button("Generate Values")
-        with form3:
-            remove_syn = st.form_submit_button("Remove Values")
-
-        if generate_syn:
-            st.session_state.power_gen_random = True
-            st.session_state.power_random_gene_vals = {}
-            if "power_value" in st.session_state:
-                st.session_state.pop("power_value")
-            st.rerun()
-
-        if remove_syn:
-            st.session_state.power_gen_random = False
-            st.session_state.power_random_gene_vals = {}
-            if "power_value" in st.session_state:
-                st.session_state.pop("power_value")
-            st.rerun()
-
-        if submitted:
-            if any(v.strip() == "" for v in gene_inputs.values()):
-                st.error("Please fill in all gene values.")
-            else:
-                st.success("Values successfully submitted!")
-                gene_dict_float = {k: float(v) for k, v in gene_inputs.items()}
-                render_result(col2, gene_dict_float)
-
-if "power_value" in st.session_state:
-    new_fig = generate_figure(df_melted, display=False)
-    with empty:
-        st.plotly_chart(new_fig, use_container_width=True)
\ No newline at end of file
+with metrics.page_run("power_prediction"):
+    app()
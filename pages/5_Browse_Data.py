@@ -0,0 +1,95 @@
+import functools
+
+import pandas as pd
+import streamlit as st
+
+from phite import browse, datasets, metrics
+from phite.lru import LRUCache
+
+st.set_page_config(layout="wide")
+
+TABLES = {
+    "Fold change post exercise": ("data_url", "genesymbol"),
+    "Week 0 baseline (w0pre) expression": ("stats_url", "Unnamed: 0"),
+    "Correlations with phenotype changes": ("corr_url", "Unnamed: 0"),
+}
+PAGE_SIZES = [25, 50, 100, 250]
+QUERY_CACHE_BYTES = 32 * 1024 * 1024
+
+# one read-only copy per process; st.cache_data would copy the frame on every rerun
+@st.cache_resource
+def load_table(secret, key):
+    return datasets.read_csv(st.secrets[secret], key=key)
+
+# row positions per (table, query), shared by every session
+@st.cache_resource
+def query_cache():
+    return LRUCache(max_bytes=QUERY_CACHE_BYTES, sizeof=lambda rows: rows.nbytes)
+
+
+def app():
+    table = st.selectbox("**Dataset:**", list(TABLES))
+    secret, key = TABLES[table]
+
+    with metrics.timer("load_table"):
+        df = load_table(secret, key)
+    numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        text = st.text_input("Gene name contains:", value="")
+    with col2:
+        sort_by = st.selectbox(
+            "Sort by:",
+            options=[None] + list(df.columns),
+            format_func=lambda c: "(file order)" if c is None else c,
+        )
+    with col3:
+        ascending = st.radio("Order:", ["Ascending", "Descending"], horizontal=True) == "Ascending"
+
+    ranges = []
+    for c in st.multiselect("Filter on numeric columns:", numeric_cols):
+        low_col, high_col = st.columns(2)
+        with low_col:
+            low = st.number_input(f"{c} at least", value=None, format="%.4g")
+        with high_col:
+            high = st.number_input(f"{c} at most", value=None, format="%.4g")
+        ranges.append((c, low, high))
+
+    query = browse.Query(key, text, tuple(ranges), sort_by, ascending)
+    with metrics.timer("query"):
+        rows = query_cache().get_or_set((table, query), lambda: browse.positions(df, query))
+
+    size_col, page_col, _ = st.columns([1, 1, 3])
+    with size_col:
+        size = st.selectbox("Rows per page:", PAGE_SIZES)
+    pages = browse.page_count(rows, size)
+    with page_col:
+        # keyed on the query so a narrower filter starts again at page 1
+        number = st.number_input(f"Page (of {pages:,}):", min_value=1, max_value=pages, value=1, step=1,
+                                 key=f"page_{table}_{hash(query)}_{size}")
+
+    start = (number - 1) * size
+    st.write(f"Rows {min(start + 1, len(rows)):,}–{min(start + size, len(rows)):,} "
+             f"of {len(rows):,} matching ({len(df):,} in total)")
+    with metrics.timer("page"):
+        st.dataframe(browse.page(df, rows, number - 1, size), hide_index=True, use_container_width=True)
+
+    metrics.cache_stats("browse_query", query_cache().stats())
+
+    fmt_col, button_col, _ = st.columns([1, 1, 3])
+    with fmt_col:
+        fmt = st.radio("Export format:", ["CSV", "Parquet"], horizontal=True)
+    with button_col:
+        # built only when clicked, off the script thread, see browse.export_file
+        st.download_button(
+            label=f"Download {len(rows):,} rows",
+            data=functools.partial(browse.export_file, df, rows, fmt.lower()),
+            file_name=f"phite_{secret.replace('_url', '')}.{fmt.lower()}",
+            mime="text/csv" if fmt == "CSV" else "application/octet-stream",
+            use_container_width=True
+        )
+
+
+with metrics.page_run("browse"):
+    app()
@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+import streamlit as st
+
+from phite import datasets, diffexp, metrics
+from phite.figures import format_comparison_label, generateVolcano, timepoint_labels
+from phite.lru import LRUCache
+
+st.set_page_config(layout="wide")
+
+RESULTS_CACHE_BYTES = 64 * 1024 * 1024
+TOP_GENES = 100
+# raw counts are integers (float32 would round them above 2**24) and sample
+# ids are labels even when they look like numbers
+COUNTS_DTYPES = defaultdict(lambda: "int64", genesymbol="string")
+SAMPLE_DTYPES = {"sample": "string", "timepoint": "string"}
+
+# raw counts with size factors and normalized counts computed once per process
+@st.cache_resource
+def load_counts():
+    return diffexp.CountData.from_frames(
+        datasets.read_csv(st.secrets["counts_url"], key="genesymbol", dtype=COUNTS_DTYPES),
+        datasets.read_csv(st.secrets["samples_url"], dtype=SAMPLE_DTYPES),
+    )
+
+# test results per (numerator, denominator), shared by every session
+@st.cache_resource
+def results_cache():
+    return LRUCache(max_bytes=RESULTS_CACHE_BYTES, sizeof=lambda df: int(df.memory_usage(deep=True).sum()))
+
+
+def app():
+    st.markdown(
+        """
+        Recompute differential expression from raw counts for any pair of timepoints,
+        including those not among the precomputed comparisons. Size factors follow
+        DESeq2's median-of-ratios method; each gene is tested with a negative binomial
+        Wald test, without the subject (paired) term of the published analysis.
+        """
+    )
+
+    # raw counts are optional: deployments without them skip this page
+    if "counts_url" not in st.secrets or "samples_url" not in st.secrets:
+        st.info("Custom comparisons need raw counts. Set counts_url and samples_url in the app secrets "
+                "to enable this page.")
+        return
+
+    with metrics.timer("load_counts"):
+        data = load_counts()
+    timepoints = [t for t in timepoint_labels if t in data.available_timepoints()]
+
+    col1, col2 = st.columns(2)
+    with col1:
+        numerator = st.selectbox("**Timepoint:**", timepoints, index=min(1, len(timepoints) - 1),
+                                 format_func=timepoint_labels.get)
+    with col2:
+        denominator = st.selectbox("**Compared against:**", timepoints, format_func=timepoint_labels.get)
+
+    if numerator == denominator:
+        st.error("Please choose two different timepoints.")
+        return
+
+    comparison = f"{numerator}_vs_{denominator}"
+    with metrics.timer("compare"):
+        with st.spinner(f"Testing {len(data.genes):,} genes..."):
+            results = results_cache().get_or_set(
+                (numerator, denominator), lambda: diffexp.compare(data, numerator, denominator)
+            )
+    metrics.cache_stats("diffexp", results_cache().stats())
+
+    significant = results[results["padj"] < 0.05]
+    st.success(
+        f"{format_comparison_label(comparison)}: {len(significant):,} of {len(results):,} genes "
+        f"with padj < 0.05 ({(significant['log2FoldChange'] > 0).sum():,} up, "
+        f"{(significant['log2FoldChange'] < 0).sum():,} down)."
+    )
+
+    with metrics.timer("build_figures"):
+        fig = generateVolcano(results, comparison)
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.write(f"**Top {TOP_GENES} genes by adjusted p-value**")
+    st.dataframe(results.sort_values("padj").head(TOP_GENES), use_container_width=True)
+
+    st.download_button(
+        label="Download all results (CSV)",
+        data=results.rename_axis("genesymbol").to_csv(),
+        file_name=f"{comparison}.csv",
+        mime="text/csv",
+    )
+
+
+with metrics.page_run("custom_comparison"):
+    app()
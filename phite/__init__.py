@@ -0,0 +1 @@
+"""Shared data, caching and model helpers for the PHITE Streamlit pages."""
@@ -0,0 +1,127 @@
+"""Shared, size-bounded store for large per-session values.
+
+Anything kept in ``st.session_state`` lives as long as the browser tab and
+is counted once per session. Pages put large values here instead (figure
+exports, generated model inputs) and keep only the returned handle in
+session state.
+
+The store is one ``LRUCache`` per process. It is bounded in bytes
+(``PHITE_ARTIFACT_MAX_BYTES``), and entries expire after ``PHITE_ARTIFACT_TTL``
+idle seconds, so an abandoned tab's artifacts are released while its
+session is still open. Each session is also capped at
+``PHITE_SESSION_MAX_BYTES``: adding past the cap evicts that session's
+least recently used entries first, and a single value larger than the cap
+is refused (``put`` returns None). A page whose handle has expired treats
+the value as missing and builds it again, as on a first visit, or tells the
+user when the value cannot be rebuilt unchanged.
+
+Entries are keyed by session id and handle, so a handle is only valid in
+the session that created it.
+"""
+import os
+import secrets
+import threading
+
+from phite import metrics
+from phite.lru import LRUCache
+
+MAX_BYTES = int(os.environ.get("PHITE_ARTIFACT_MAX_BYTES", str(256 * 1024 * 1024)))
+SESSION_MAX_BYTES = int(os.environ.get("PHITE_SESSION_MAX_BYTES", str(16 * 1024 * 1024)))
+TTL = float(os.environ.get("PHITE_ARTIFACT_TTL", "1800"))
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class ArtifactStore:
+    def __init__(self, max_bytes=MAX_BYTES, session_max_bytes=SESSION_MAX_BYTES, ttl=TTL, **kwargs):
+        self.cache = LRUCache(max_bytes, ttl=ttl, **kwargs)
+        self.session_max_bytes = session_max_bytes
+        self._lock = threading.Lock()
+
+    def put(self, session, value, size=None):
+        """Store ``value`` for ``session`` and return its handle.
+
+        Returns None, storing nothing, if ``value`` alone exceeds the session cap.
+        """
+        size = self.cache.sizeof(value) if size is None else size
+        if size > self.session_max_bytes:
+            return None
+        handle = secrets.token_hex(8)
+        with self._lock:
+            if not self.cache.put((session, handle), value, size):
+                return None
+            # over the session's cap: drop its least recently used entries
+            owned = [(key, n) for key, n in self.cache.sizes().items() if key[0] == session]
+            used = sum(n for _, n in owned)
+            for key, n in owned:
+                if used <= self.session_max_bytes:
+                    break
+                self.cache.evict(key)
+                used -= n
+        return handle
+
+    def get(self, session, handle, default=None):
+        if handle is None:
+            return default
+        return self.cache.get((session, handle), default)
+
+    def discard(self, session, handle):
+        self.cache.pop((session, handle))
+
+    def session_usage(self):
+        """Bytes held per session id."""
+        usage = {}
+        for (session, _), n in self.cache.sizes().items():
+            usage[session] = usage.get(session, 0) + n
+        return usage
+
+    def stats(self, session=None):
+        usage = self.session_usage()
+        stats = self.cache.stats()
+        stats.update(
+            sessions=len(usage),
+            session_max_bytes=self.session_max_bytes,
+            largest_session_bytes=max(usage.values(), default=0),
+        )
+        if session is not None:
+            stats["session_bytes"] = usage.get(session, 0)
+        return stats
+
+
+def store():
+    """The process-wide store shared by every session."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
+
+
+def put(state, slot, value):
+    """Store ``value`` and keep its handle at ``state[slot]``, replacing any previous one.
+
+    Returns the handle, or None if the value is too large to keep; the slot is then left empty.
+    """
+    discard(state, slot)
+    handle = store().put(metrics.session_id(), value)
+    if handle is not None:
+        state[slot] = handle
+    return handle
+
+
+def get(state, slot, default=None):
+    """The value behind ``state[slot]``, or ``default`` if unset or expired."""
+    return store().get(metrics.session_id(), state.get(slot), default)
+
+
+def discard(state, slot):
+    handle = state.get(slot)
+    if handle is not None:
+        store().discard(metrics.session_id(), handle)
+        del state[slot]
+
+
+def record_usage():
+    """Attach the store's stats, including this session's bytes, to the current run."""
+    metrics.cache_stats("artifacts", store().stats(metrics.session_id()))
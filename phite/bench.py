@@ -0,0 +1,256 @@
+"""Offline benchmark suite for data loading, lookups, figures, differential
+expression and predictions.
+
+Runs against synthetic datasets (``phite.synthetic``) so no secrets or
+network are needed::
+
+    python -m phite.bench --genes 1000 10000 100000
+    python -m phite.bench --genes 20000 --compare latest
+
+Each case reports latency percentiles, throughput and the peak Python heap
+allocation of a single call (tracemalloc). Results are written as JSON under
+``benchmarks/results/`` named by timestamp and git revision; ``--compare``
+diffs p50 latencies against an earlier file and exits non-zero on
+regressions beyond ``--threshold``.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from phite import cohort, corrstore, datasets, diffexp, figures, manifest, profile, serving, synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+MODELS = {"power": "power_predict.joblib", "vo2": "vo2_predict.joblib"}
+COMPACT_MODELS = {"power": "power_predict.npz", "vo2": "vo2_predict.npz"}
+BATCH_SIZES = [100, 1000]
+LOOKUP_BATCH = 1000
+COHORT_SIZE = 100000
+# gene x gene stores grow with the square of the gene count
+GENE_CORR_MAX_GENES = 20000
+
+
+def measure(fn, repeat, items=1, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms = np.asarray(times) * 1000
+    return {
+        "repeat": repeat,
+        "items": items,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "items_per_s": float(items / (ms.mean() / 1000)) if ms.mean() else float("inf"),
+        "peak_alloc_bytes": int(peak),
+    }
+
+
+def _image_export_available():
+    try:
+        import kaleido  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def cases(work_dir, n_genes, models, compact_models, seed=0):
+    """Yield ``(name, fn, items, repeat_scale)`` for one synthetic dataset size."""
+    extra = ["PPARD"] + [g for m in models.values() for g in synthetic.model_features(m)]
+    paths = synthetic.write_all(work_dir, n_genes, extra_genes=extra, seed=seed)
+    rng = np.random.default_rng(seed)
+
+    def load_cold():
+        with tempfile.TemporaryDirectory(dir=work_dir) as cache_dir:
+            datasets.read_csv(paths["data_url"], key="genesymbol", cache_dir=cache_dir)
+
+    warm_dir = os.path.join(work_dir, "cache")
+    datasets.fetch(paths["data_url"], key="genesymbol", cache_dir=warm_dir)
+
+    yield "load.read_csv", lambda: pd.read_csv(paths["data_url"]), 1, 0.2
+    yield "load.cache_cold", load_cold, 1, 0.2
+    yield "load.cache_warm", lambda: datasets.read_csv(paths["data_url"], key="genesymbol", cache_dir=warm_dir), 1, 0.2
+
+    df = datasets.read_csv(paths["data_url"], key="genesymbol", cache_dir=warm_dir)
+    indexed = df.set_index("genesymbol")
+    stats_df = pd.read_csv(paths["stats_url"])
+    stats_indexed = stats_df.set_index("Unnamed: 0")
+    genes = df["genesymbol"].astype(object).to_numpy()
+    gene = "PPARD"
+    batch = list(rng.choice(genes, min(LOOKUP_BATCH, len(genes)), replace=False))
+
+    yield "lookup.single_scan", lambda: figures.process_df(gene, df), 1, 1
+    yield "lookup.single_index", lambda: indexed.loc[gene], 1, 1
+    yield "lookup.stats_set_index", lambda: stats_df.set_index("Unnamed: 0").loc[gene], 1, 1
+    yield "lookup.batch_index", lambda: indexed.loc[batch], len(batch), 1
+
+    profiles = profile.build_profiles(df, stats_df, pd.read_csv(paths["corr_url"]),
+                                      {name: synthetic.model_features(m) for name, m in models.items()})
+    yield "lookup.profile_single", lambda: profiles.lookup(gene), 1, 1
+    yield "lookup.profile_batch", lambda: [profiles.lookup(g) for g in batch], len(batch), 0.2
+
+    corr_df = pd.read_csv(paths["corr_url"])
+    phenotype_store = corrstore.CorrStore(corrstore.from_table(corr_df, os.path.join(work_dir, "corr_store")))
+    yield "corrstore.phenotype_row", lambda: phenotype_store.dense_row(gene), 1, 1
+    if n_genes <= GENE_CORR_MAX_GENES:
+        expression = rng.normal(size=(len(genes), 40))
+        gene_store = corrstore.CorrStore(corrstore.from_expression(
+            expression, genes, os.path.join(work_dir, "gene_corr"), min_abs_r=0.5))
+        yield "corrstore.gene_top_k", lambda: gene_store.top_k(gene, 20), 1, 1
+        yield "corrstore.gene_row", lambda: gene_store.row(gene), 1, 1
+
+    plot_df = figures.process_df(gene, df)
+    stat_row = stats_indexed.loc[gene]
+    yield "figures.generateBar", lambda: figures.generateBar(plot_df, gene), 1, 1
+    yield "figures.generateTable", lambda: figures.generateTable(plot_df, gene), 1, 1
+    yield "figures.generateStatsTable", lambda: figures.generateStatsTable(stat_row, gene), 1, 1
+
+    validation = manifest.load(os.path.join(ROOT, "power_predict.manifest.json"))["validation"]
+    cohort_predicted = rng.normal(np.mean(validation["predicted"]), np.std(validation["observed"]), COHORT_SIZE)
+    summary = cohort.summarize(cohort_predicted, validation["predicted"], validation["observed"])
+    yield "cohort.summarize", lambda: cohort.summarize(cohort_predicted, validation["predicted"],
+                                                      validation["observed"]), COHORT_SIZE, 0.5
+    yield "figures.generateCohortDashboard", lambda: figures.generateCohortDashboard(
+        summary, "PowerPeak change", "W/kg"), 1, 0.5
+
+    counts_df, sheet = synthetic.counts(list(genes), seed=seed)
+    counts = diffexp.CountData.from_frames(counts_df, sheet)
+    yield "diffexp.size_factors", lambda: diffexp.size_factors(counts.counts), 1, 0.2
+    yield "diffexp.compare", lambda: diffexp.compare(counts, "w12pre", "w0pre"), n_genes, 0.2
+
+    if _image_export_available():
+        bar = figures.generateBar(plot_df, gene)
+        yield "export.png", lambda: bar.to_image(format="png", engine="kaleido"), 1, 0.1
+        yield "export.pdf", lambda: bar.to_image(format="pdf", engine="kaleido"), 1, 0.1
+
+    for name, model in models.items():
+        features = synthetic.model_features(model)
+        single = cohort.model_inputs(features, stats_indexed, 1, seed)
+        yield f"predict.{name}.single", lambda m=model, x=single: m.predict(x), 1, 1
+        for size in BATCH_SIZES:
+            x = cohort.model_inputs(features, stats_indexed, size, seed)
+            yield f"predict.{name}.batch{size}", lambda m=model, x=x: m.predict(x), size, 0.5
+
+    for name, compact in compact_models.items():
+        single = cohort.model_inputs(compact.features, stats_indexed, 1, seed).to_dict("records")
+        yield f"predict.{name}_compact.single", lambda m=compact, x=single: m.predict(x), 1, 1
+        for size in BATCH_SIZES:
+            x = cohort.model_inputs(compact.features, stats_indexed, size, seed).to_numpy()
+            yield f"predict.{name}_compact.batch{size}", lambda m=compact, x=x: m.predict(x), size, 0.5
+
+
+def run(gene_counts, repeat, seed=0):
+    models = {name: joblib.load(os.path.join(ROOT, path)) for name, path in MODELS.items()}
+    compact_models = {name: serving.load(os.path.join(ROOT, path)) for name, path in COMPACT_MODELS.items()}
+    results = {}
+    for n_genes in gene_counts:
+        results[str(n_genes)] = {}
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name, fn, items, scale in cases(work_dir, n_genes, models, compact_models, seed):
+                stats = measure(fn, max(int(repeat * scale), 3), items=items)
+                results[str(n_genes)][name] = stats
+                print(f"{n_genes:>7} {name:<34} p50={stats['p50_ms']:10.3f}ms "
+                      f"p95={stats['p95_ms']:10.3f}ms {stats['items_per_s']:12.1f}/s "
+                      f"peak={stats['peak_alloc_bytes'] / 1e6:8.2f}MB", flush=True)
+    return results
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return out.stdout.strip()
+
+
+def save(results, out_dir=RESULTS_DIR):
+    revision = _git_revision()
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    doc = {
+        "meta": {
+            "revision": revision,
+            "timestamp": stamp,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "results": results,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{stamp}_{revision}.json")
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2)
+    return path
+
+
+def latest(out_dir=RESULTS_DIR):
+    files = sorted(glob.glob(os.path.join(out_dir, "*.json")))
+    return files[-1] if files else None
+
+
+def compare(baseline, results, threshold):
+    """Return ``(size, case, old_p50, new_p50)`` for cases slower than ``threshold``."""
+    regressions = []
+    for size, cases_ in results.items():
+        for name, new in cases_.items():
+            old = baseline.get(size, {}).get(name)
+            if old and new["p50_ms"] > old["p50_ms"] * (1 + threshold):
+                regressions.append((size, name, old["p50_ms"], new["p50_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--genes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="earlier results file, or 'latest'")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative p50 slowdown before a case counts as a regression")
+    args = parser.parse_args(argv)
+
+    baseline_path = latest(args.out) if args.compare == "latest" else args.compare
+    results = run(args.genes, args.repeat, args.seed)
+    print(f"results written to {save(results, args.out)}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(baseline, results, args.threshold)
+        for size, name, old, new in regressions:
+            print(f"REGRESSION {size} {name}: p50 {old:.3f}ms -> {new:.3f}ms")
+        if regressions:
+            return 1
+        print(f"no regressions against {baseline_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Server-side filtering, sorting and paging for the data browser.
+
+The browser never receives a whole table. A query (gene substring, numeric
+ranges, sort column) is turned into an array of row positions, working on
+one column at a time. Only the requested page of rows is materialised.
+Position arrays are small, so they are cached per table and query in a
+shared ``LRUCache``. Paging and sort changes on the same filter then skip
+the filtering work.
+
+Missing values sort last in either direction. Exports are written a chunk
+at a time.
+
+Text filters on categorical columns (gene symbols ingested by
+``phite.ingest``) match against the categories once and then compare
+integer codes, instead of scanning every row's string.
+"""
+import io
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_CHUNK_ROWS = 10_000
+
+Query = namedtuple("Query", ["text_column", "text", "ranges", "sort_by", "ascending"])
+Query.__new__.__defaults__ = (None, "", (), None, True)
+
+
+def _text_mask(column, text):
+    text = text.strip().upper()
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories = column.cat.categories.astype(str).str.upper()
+        matching = np.flatnonzero(categories.str.contains(text, regex=False))
+        return np.isin(column.cat.codes.to_numpy(), matching)
+    return column.astype(str).str.upper().str.contains(text, regex=False).to_numpy()
+
+
+def _sort_keys(column):
+    """Sortable keys for ``column``, with missing values left missing."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # rank categories alphabetically so codes sort like the strings they stand for
+        ranks = column.cat.categories.astype(str).argsort().argsort()
+        codes = column.cat.codes.to_numpy()
+        return np.where(codes >= 0, ranks[np.maximum(codes, 0)], np.nan)
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy(dtype=np.float64, na_value=np.nan)
+    return column.astype(str).where(column.notna(), None).to_numpy()
+
+
+def positions(df, query):
+    """Row positions matching ``query``, in display order."""
+    mask = np.ones(len(df), dtype=bool)
+    if query.text and query.text_column:
+        mask &= _text_mask(df[query.text_column], query.text)
+    for column, low, high in query.ranges:
+        values = df[column].to_numpy(dtype=np.float64)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    rows = np.flatnonzero(mask)
+
+    if query.sort_by:
+        keys = pd.Series(_sort_keys(df[query.sort_by])[rows])
+        order = keys.sort_values(ascending=query.ascending, na_position="last", kind="stable").index
+        rows = rows[order.to_numpy()]
+    return rows.astype(np.int64)
+
+
+def page(df, rows, number, size):
+    """The ``number``-th page (0-based) of ``size`` rows."""
+    start = number * size
+    return df.take(rows[start:start + size])
+
+
+def page_count(rows, size):
+    return max((len(rows) + size - 1) // size, 1)
+
+
+def iter_chunks(df, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(rows), chunk_rows):
+        yield df.take(rows[start:start + chunk_rows])
+
+
+def export_csv(df, rows, out=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write the selected rows as CSV, one chunk at a time."""
+    out = io.BytesIO() if out is None else out
+    for i, chunk in enumerate(iter_chunks(df, rows, chunk_rows)):
+        out.write(chunk.to_csv(index=False, header=(i == 0)).encode("utf-8"))
+    if not len(rows):
+        out.write(df.head(0).to_csv(index=False).encode("utf-8"))
+    out.seek(0)
+    return out
+
+
+def export_parquet(df, rows, out=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write the selected rows as Parquet, one row group per chunk."""
+    out = io.BytesIO() if out is None else out
+    schema = pa.Schema.from_pandas(df.head(0), preserve_index=False)
+    # object columns have no type without rows; in these tables they hold text
+    schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema],
+                       metadata=schema.metadata)
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in iter_chunks(df, rows, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    out.seek(0)
+    return out
+
+
+EXPORTERS = {"csv": export_csv, "parquet": export_parquet}
+
+
+def export_file(df, rows, fmt, chunk_rows=EXPORT_CHUNK_ROWS):
+    """The export written chunk by chunk to an anonymous temporary file.
+
+    The file is returned rewound, so the whole export is only ever in memory
+    once, when the download handler reads it.
+    """
+    # unbuffered: Streamlit's download reads raw file objects but not BufferedRandom
+    out = tempfile.TemporaryFile(buffering=0)
+    try:
+        return EXPORTERS[fmt](df, rows, out, chunk_rows)
+    except BaseException:
+        out.close()
+        raise
@@ -0,0 +1,135 @@
+"""Batch scoring and server-side summaries for the cohort dashboard.
+
+A cohort can hold thousands of participants, far more than the validation
+plot's one marker per person can show. Everything the dashboard draws is
+aggregated here: ``np.histogram`` densities on bin edges shared with the
+validation set, the ranked prediction curve sampled at a fixed number of
+quantiles, and box-plot quantiles. The browser receives a few hundred
+numbers whatever the cohort size.
+"""
+import numpy as np
+import pandas as pd
+
+BINS = 40
+RANK_POINTS = 200
+CHUNK_ROWS = 5000
+MAX_ROWS = 100_000
+
+
+def read_inputs(source, features, id_col=None):
+    """Participant ids and the model's input columns from an uploaded CSV.
+
+    The first column is taken as the participant id unless it is a model
+    gene. Raises ``ValueError`` naming the missing genes or bad values.
+    """
+    df = pd.read_csv(source)
+    if len(df) > MAX_ROWS:
+        raise ValueError(f"{len(df):,} rows; at most {MAX_ROWS:,} participants can be scored at once")
+    missing = [f for f in features if f not in df.columns]
+    if missing:
+        raise ValueError(f"missing {len(missing)} input gene column(s): {', '.join(missing[:10])}"
+                         + (" ..." if len(missing) > 10 else ""))
+    if id_col is None and df.columns[0] not in features:
+        id_col = df.columns[0]
+    ids = df[id_col].astype(str).to_numpy() if id_col is not None else np.array(
+        [f"Participant {i + 1}" for i in range(len(df))], dtype=object)
+
+    X = df[features].apply(pd.to_numeric, errors="coerce")
+    bad = X.isna().any(axis=1)
+    if bad.any():
+        raise ValueError(f"{bad.sum():,} row(s) have empty or non-numeric gene values, "
+                         f"first at row {int(np.flatnonzero(bad.to_numpy())[0]) + 2} of the file")
+    return ids, X
+
+
+def model_inputs(features, stats, n_rows, seed=0):
+    """Simulated participants: expression drawn per gene from the baseline stats.
+
+    ``stats`` is indexed by gene, e.g. ``datasets.read_genes`` of the stats table.
+
+    Each value is normal with the gene's mean and std, clipped to its observed
+    range, as the prediction pages' "Generate Values" does for one person.
+    """
+    rng = np.random.default_rng(seed)
+    row = stats.loc[features]
+    values = rng.normal(row["mean"].to_numpy(), row["std"].to_numpy(), size=(n_rows, len(features)))
+    values = np.clip(values, row["min"].to_numpy(), row["max"].to_numpy())
+    return pd.DataFrame(values, columns=features)
+
+
+def predict(model, X, chunk_rows=CHUNK_ROWS):
+    """``model.predict`` over row chunks, bounding the tree-walk working set."""
+    X = X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+    if not len(X):
+        return np.empty(0)
+    return np.concatenate([model.predict(X[i:i + chunk_rows]) for i in range(0, len(X), chunk_rows)])
+
+
+def _box(values):
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {
+        "q1": float(q1), "median": float(median), "q3": float(q3),
+        "lowerfence": float(inside.min()), "upperfence": float(inside.max()),
+        "mean": float(values.mean()), "n": int(values.size),
+    }
+
+
+def summarize(predicted, validation_predicted, validation_observed, threshold=0.0,
+              bins=BINS, rank_points=RANK_POINTS):
+    """Everything the dashboard plots, as small arrays and scalars.
+
+    Participants whose predicted change exceeds ``threshold`` are counted as
+    responders.
+    """
+    predicted = np.asarray(predicted, dtype=np.float64)
+    val_pred = np.asarray(validation_predicted, dtype=np.float64)
+    val_obs = np.asarray(validation_observed, dtype=np.float64)
+    if not predicted.size:
+        raise ValueError("no predictions to summarize")
+
+    low = min(predicted.min(), val_pred.min(), val_obs.min())
+    high = max(predicted.max(), val_pred.max(), val_obs.max())
+    edges = np.histogram_bin_edges([low, high], bins=bins)
+
+    # rank 0 is the largest predicted change
+    ranks = np.linspace(0, 1, min(rank_points, predicted.size))
+    ranked = np.quantile(predicted, 1 - ranks)
+
+    responders = int((predicted > threshold).sum())
+    return {
+        "n": int(predicted.size),
+        "threshold": float(threshold),
+        "responders": responders,
+        "non_responders": int(predicted.size - responders),
+        "edges": edges,
+        "centers": (edges[:-1] + edges[1:]) / 2,
+        "density": {
+            "cohort": np.histogram(predicted, edges, density=True)[0],
+            "validation_predicted": np.histogram(val_pred, edges, density=True)[0],
+            "validation_observed": np.histogram(val_obs, edges, density=True)[0],
+        },
+        "rank_pct": ranks * 100,
+        "ranked": ranked,
+        "boxes": {
+            "Cohort (predicted)": _box(predicted),
+            "Validation (predicted)": _box(val_pred),
+            "Validation (observed)": _box(val_obs),
+        },
+        "validation": {"predicted": val_pred, "observed": val_obs},
+    }
+
+
+def table(ids, predicted, threshold=0.0):
+    """Per-participant predictions ranked from largest change, for download."""
+    df = pd.DataFrame({"participant": ids, "predicted": predicted})
+    df["responder"] = df["predicted"] > threshold
+    df = df.sort_values("predicted", ascending=False, kind="stable")
+    df.insert(1, "rank", np.arange(1, len(df) + 1))
+    return df
+
+
+def table_csv(ids, predicted, threshold=0.0):
+    """``table`` as CSV text, for ``st.download_button`` to build when clicked."""
+    return table(ids, predicted, threshold).to_csv(index=False)
@@ -0,0 +1,302 @@
+"""Sparse, quantized, memory-mapped storage for correlation matrices.
+
+Dense float64 gene x gene correlations with p-values cost 16 bytes per cell,
+about 6 GB for 20,000 genes. A store keeps only the entries that pass a
+threshold (``min_abs_r``, and ``max_p`` when p-values are given) in a CSR
+layout of flat binary files under one directory:
+
+``indptr.bin``   int64, row start offsets (n_rows + 1)
+``indices.bin``  int32, column of each entry
+``r.bin``        int16, correlation as fixed point, ``round(r * 32767)``
+``logp.bin``     uint16, ``round(-log10(p) * 1000)``, 65535 for NaN (optional)
+``meta.json``    row and column names, thresholds and counts
+
+The correlation error is below 2e-5. p-values keep three decimals of
+``-log10(p)``, so 0.2% relative error, down to 1e-65; a missing p-value
+is stored as the reserved code and read back as NaN. Within each row the
+entries are ordered by decreasing ``|r|``. A top-k query therefore reads the
+first k entries of the row, and a row query reads one contiguous slice. The
+reader memory-maps the files, so resident memory is the pages actually
+touched, not the file size.
+
+Stores are written row block by row block, either from an existing
+correlation table or straight from an expression matrix, and never hold a
+dense matrix::
+
+    python -m phite.corrstore from-table corr.csv corr_store/
+    python -m phite.corrstore from-expression counts.csv gene_corr/ --min-abs-r 0.5
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+from scipy.stats import t as t_dist
+
+FORMAT_VERSION = 2
+R_SCALE = 32767
+LOGP_SCALE = 1000
+# the top code stands for a missing p-value
+LOGP_NAN = np.iinfo(np.uint16).max
+MAX_LOGP = (LOGP_NAN - 1) / LOGP_SCALE
+CHUNK_ROWS = 500
+DTYPES = {"indptr": np.int64, "indices": np.int32, "r": np.int16, "logp": np.uint16}
+
+
+def quantize_r(r):
+    return np.round(np.clip(r, -1, 1) * R_SCALE).astype(np.int16)
+
+
+def quantize_p(p):
+    p = np.asarray(p, dtype=np.float64)
+    missing = np.isnan(p)
+    with np.errstate(divide="ignore"):
+        logp = -np.log10(np.clip(np.where(missing, 1.0, p), 0, 1))
+    codes = np.round(np.minimum(logp, MAX_LOGP) * LOGP_SCALE).astype(np.uint16)
+    codes[missing] = LOGP_NAN
+    return codes
+
+
+def dequantize_p(codes):
+    codes = np.asarray(codes)
+    p = 10.0 ** (-codes.astype(np.float64) / LOGP_SCALE)
+    p[codes == LOGP_NAN] = np.nan
+    return p
+
+
+class Writer:
+    """Append row blocks in order, then ``close()`` to publish the store."""
+
+    def __init__(self, path, columns, min_abs_r=0.0, max_p=None, with_pvalues=True, kind=""):
+        self.path = path
+        self.columns = [str(c) for c in columns]
+        self.min_abs_r = min_abs_r
+        self.max_p = max_p
+        self.with_pvalues = with_pvalues
+        self.kind = kind
+        self.rows = []
+        self.counts = []
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._tmp = tempfile.mkdtemp(dir=parent, prefix=".corrstore-")
+        names = ["indices", "r"] + (["logp"] if with_pvalues else [])
+        self._files = {name: open(os.path.join(self._tmp, f"{name}.bin"), "wb") for name in names}
+
+    def add(self, rows, r, p=None, exclude=None):
+        """Add a block: ``r`` (and ``p``) are ``len(rows) x len(columns)``.
+
+        ``p`` may instead be a function of the correlations that pass
+        ``min_abs_r``, so p-values are only computed for those. ``exclude``
+        is an optional column position per row to drop, e.g. the diagonal of
+        a gene x gene block.
+        """
+        r = np.asarray(r)
+        if self.with_pvalues and p is None:
+            raise ValueError("this store keeps p-values; pass p")
+        keep = np.abs(r) >= self.min_abs_r
+        keep &= ~np.isnan(r)
+        if exclude is not None:
+            keep[np.arange(len(rows)), exclude] = False
+
+        row_pos, cols = np.nonzero(keep)
+        del keep
+        values = r[row_pos, cols].astype(np.float64)
+        if callable(p):
+            pvalues = p(values)
+        elif p is not None:
+            pvalues = np.asarray(p, dtype=np.float64)[row_pos, cols]
+        else:
+            pvalues = None
+        if pvalues is not None and self.max_p is not None:
+            significant = pvalues <= self.max_p
+            row_pos, cols, values, pvalues = (row_pos[significant], cols[significant],
+                                              values[significant], pvalues[significant])
+
+        # row by row, strongest |r| first
+        order = np.lexsort((-np.abs(values), row_pos))
+        self._files["indices"].write(cols[order].astype(np.int32).tobytes())
+        self._files["r"].write(quantize_r(values[order]).tobytes())
+        if self.with_pvalues:
+            self._files["logp"].write(quantize_p(pvalues[order]).tobytes())
+        self.counts.extend(np.bincount(row_pos, minlength=len(rows)).tolist())
+        self.rows.extend(str(g) for g in rows)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        indptr = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=indptr[1:])
+        indptr.tofile(os.path.join(self._tmp, "indptr.bin"))
+        meta = {
+            "format": FORMAT_VERSION,
+            "kind": self.kind,
+            "rows": self.rows,
+            "columns": self.columns,
+            "nnz": int(indptr[-1]),
+            "min_abs_r": self.min_abs_r,
+            "max_p": self.max_p,
+            "r_scale": R_SCALE,
+            "logp_scale": LOGP_SCALE if self.with_pvalues else None,
+        }
+        with open(os.path.join(self._tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self._tmp, self.path)
+        return self.path
+
+
+class CorrStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported store format {self.meta.get('format')!r}")
+        self.rows = pd.Index(self.meta["rows"], dtype=object)
+        self.columns = np.asarray(self.meta["columns"], dtype=object)
+        self.indptr = self._map("indptr")
+        self.indices = self._map("indices")
+        self.r = self._map("r")
+        self.logp = self._map("logp") if self.meta["logp_scale"] else None
+
+    def _map(self, name):
+        path = os.path.join(self.path, f"{name}.bin")
+        # np.memmap refuses empty files
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=DTYPES[name])
+        return np.memmap(path, dtype=DTYPES[name], mode="r")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    @property
+    def nnz(self):
+        return self.meta["nnz"]
+
+    @property
+    def nbytes(self):
+        """Size of the store on disk, which bounds what the memory map can touch."""
+        return sum(os.path.getsize(os.path.join(self.path, f"{n}.bin"))
+                   for n in DTYPES if os.path.exists(os.path.join(self.path, f"{n}.bin")))
+
+    def _slice(self, name, k=None):
+        i = self.rows.get_loc(name)
+        start, stop = int(self.indptr[i]), int(self.indptr[i + 1])
+        if k is not None:
+            stop = min(stop, start + k)
+        return slice(start, stop)
+
+    def _frame(self, s):
+        out = pd.DataFrame({
+            "column": self.columns[self.indices[s]],
+            "r": self.r[s].astype(np.float64) / R_SCALE,
+        })
+        if self.logp is not None:
+            out["p"] = dequantize_p(self.logp[s])
+        return out
+
+    def row(self, name):
+        """Stored entries of row ``name``, strongest ``|r|`` first; KeyError if absent."""
+        return self._frame(self._slice(name))
+
+    def top_k(self, name, k=10):
+        """The ``k`` strongest stored correlations of row ``name``."""
+        return self._frame(self._slice(name, k))
+
+    def dense_row(self, name):
+        """Row ``name`` over all columns; entries below the threshold are NaN."""
+        s = self._slice(name)
+        r = np.full(len(self.columns), np.nan)
+        p = np.full(len(self.columns), np.nan)
+        cols = np.asarray(self.indices[s])
+        r[cols] = self.r[s] / R_SCALE
+        if self.logp is not None:
+            p[cols] = dequantize_p(self.logp[s])
+        return pd.DataFrame({"r": r, "p": p}, index=pd.Index(self.columns, dtype=object))
+
+
+def from_table(df, path, key="Unnamed: 0", min_abs_r=0.0, max_p=None, chunk_rows=CHUNK_ROWS):
+    """Store a ``corr_url``-layout table (``<m>_corr`` / ``<m>_p_val`` columns)."""
+    measures = [c[:-len("_corr")] for c in df.columns if str(c).endswith("_corr")]
+    with_p = all(f"{m}_p_val" in df.columns for m in measures)
+    df = df.dropna(subset=[key]).drop_duplicates(subset=[key], keep="first")
+    writer = Writer(path, measures, min_abs_r, max_p, with_pvalues=with_p, kind="gene x phenotype")
+    for start in range(0, len(df), chunk_rows):
+        block = df.iloc[start:start + chunk_rows]
+        writer.add(
+            block[key].astype(str).to_numpy(),
+            block[[f"{m}_corr" for m in measures]].to_numpy(dtype=np.float64),
+            block[[f"{m}_p_val" for m in measures]].to_numpy(dtype=np.float64) if with_p else None,
+        )
+    return writer.close()
+
+
+def from_expression(X, genes, path, min_abs_r=0.5, max_p=None, chunk_rows=CHUNK_ROWS):
+    """Gene x gene Pearson correlations of ``X`` (genes x samples), block by block.
+
+    Only ``chunk_rows x n_genes`` float32 correlations exist in memory at a
+    time (40 MB for 500 x 20,000). Genes with zero variance get no entries;
+    the diagonal is not stored.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    genes = np.asarray(genes, dtype=object)
+    n = X.shape[1]
+    if n < 3:
+        raise ValueError("need at least 3 samples to test correlations")
+    centered = X - X.mean(axis=1, keepdims=True)
+    norms = np.sqrt((centered ** 2).sum(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # float32 blocks: the stored precision is 1/32767 anyway
+        Z = np.where(norms[:, None] > 0, centered / norms[:, None], np.nan).astype(np.float32)
+
+    def pvalue(r):
+        with np.errstate(divide="ignore"):
+            t = r * np.sqrt((n - 2) / (1 - r ** 2))
+        return 2 * t_dist.sf(np.abs(t), n - 2)
+
+    writer = Writer(path, genes, min_abs_r, max_p, kind="gene x gene")
+    for start in range(0, len(genes), chunk_rows):
+        stop = min(start + chunk_rows, len(genes))
+        r = np.clip(Z[start:stop] @ Z.T, -1, 1)
+        writer.add(genes[start:stop], r, pvalue, exclude=np.arange(start, stop))
+    return writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    table = sub.add_parser("from-table", help="convert a corr_url-layout CSV")
+    table.add_argument("csv")
+    table.add_argument("out")
+    table.add_argument("--key", default="Unnamed: 0")
+    expression = sub.add_parser("from-expression", help="gene x gene correlations of an expression CSV")
+    expression.add_argument("csv", help="genes as rows, first column gene id, one column per sample")
+    expression.add_argument("out")
+    for p in (table, expression):
+        p.add_argument("--min-abs-r", type=float, default=0.0 if p is table else 0.5)
+        p.add_argument("--max-p", type=float, default=None)
+        p.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    if args.command == "from-table":
+        path = from_table(pd.read_csv(args.csv), args.out, args.key, args.min_abs_r, args.max_p, args.chunk_rows)
+    else:
+        df = pd.read_csv(args.csv, index_col=0)
+        path = from_expression(df.to_numpy(), df.index.astype(str).to_numpy(), args.out,
+                               args.min_abs_r, args.max_p, args.chunk_rows)
+    store = CorrStore(path)
+    dense = len(store) * len(store.columns) * 16
+    print(f"{path}: {len(store):,} rows x {len(store.columns):,} columns, {store.nnz:,} entries, "
+          f"{store.nbytes / 1e6:.1f} MB (dense float64 r + p: {dense / 1e6:.1f} MB)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
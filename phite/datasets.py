@@ -0,0 +1,209 @@
+"""Persistent on-disk cache for the remote CSV datasets.
+
+Each URL is downloaded once, converted to Parquet and stored under
+``CACHE_DIR`` together with the validators (ETag / Last-Modified) the server
+sent. Later loads revalidate with a conditional request and only re-download
+and re-parse when the server reports a change. If the server cannot be
+reached or answers with an error, the last good copy is used, with a
+warning, so a restart never blocks on the network. Without a cached copy
+the error is raised.
+
+``dtype`` is handed to ``pd.read_csv`` during ingestion, e.g. to keep raw
+counts as integers and sample ids as strings. It is recorded with the
+cached copy, and a copy ingested with other dtypes is rebuilt.
+"""
+import collections
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+import warnings
+
+import pandas as pd
+
+from phite import ingest
+
+CACHE_DIR = os.environ.get(
+    "PHITE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".phite_cache"),
+)
+TIMEOUT = 30
+
+
+def _cache_paths(url, cache_dir):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:20]
+    return os.path.join(cache_dir, f"{key}.parquet"), os.path.join(cache_dir, f"{key}.json")
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta_path, meta):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(meta_path), suffix=".json.tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path)
+
+
+def _is_local(url):
+    return urllib.parse.urlparse(url).scheme in ("", "file")
+
+
+def _local_path(url):
+    parsed = urllib.parse.urlparse(url)
+    return urllib.request.url2pathname(parsed.path) if parsed.scheme == "file" else url
+
+
+def _download(response, dest):
+    digest = hashlib.sha256()
+    with open(dest, "wb") as out:
+        while True:
+            block = response.read(1 << 20)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+    return digest.hexdigest()
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _dtype_spec(dtype):
+    # JSON form of a read_csv dtype mapping; "*" is a defaultdict's default
+    if dtype is None:
+        return None
+    spec = {str(col): str(t) for col, t in dtype.items()}
+    if isinstance(dtype, collections.defaultdict):
+        spec["*"] = str(dtype.default_factory())
+    return spec
+
+
+def _is_current(parquet_path, meta, dtype=None):
+    return (os.path.exists(parquet_path)
+            and os.path.exists(ingest.index_path(parquet_path))
+            and meta.get("format") == ingest.FORMAT_VERSION
+            and meta.get("dtype") == _dtype_spec(dtype))
+
+
+def _fetch_local(url, parquet_path, meta_path, meta, key, dtype):
+    path = _local_path(url)
+    stat = os.stat(path)
+    validator = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    cached = _is_current(parquet_path, meta, dtype)
+    if cached and meta.get("validator") == validator:
+        return parquet_path
+
+    sha = _sha256(path)
+    if not (cached and meta.get("sha256") == sha):
+        ingest.csv_to_parquet(path, parquet_path, key=key, dtype=dtype)
+    _write_meta(meta_path, {"url": url, "format": ingest.FORMAT_VERSION, "dtype": _dtype_spec(dtype),
+                            "validator": validator, "sha256": sha})
+    return parquet_path
+
+
+def _fetch_remote(url, parquet_path, meta_path, meta, key, dtype, timeout):
+    cached = _is_current(parquet_path, meta, dtype)
+    request = urllib.request.Request(url)
+    if cached:
+        if meta.get("etag"):
+            request.add_header("If-None-Match", meta["etag"])
+        if meta.get("last_modified"):
+            request.add_header("If-Modified-Since", meta["last_modified"])
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            return parquet_path
+        # 404, 401, 500...: the server answered but not with the data
+        if not cached:
+            raise
+        warnings.warn(f"{url}: HTTP {e.code} {e.reason}; serving the cached copy", stacklevel=3)
+        return parquet_path
+    except (urllib.error.URLError, OSError) as e:
+        # unreachable server: fall back to the last good copy
+        if not cached:
+            raise
+        warnings.warn(f"{url}: {e}; serving the cached copy", stacklevel=3)
+        return parquet_path
+
+    fd, tmp_csv = tempfile.mkstemp(dir=os.path.dirname(parquet_path), suffix=".csv")
+    os.close(fd)
+    try:
+        with response:
+            sha = _download(response, tmp_csv)
+        # servers without validators still skip the re-parse when the bytes are unchanged
+        if not (cached and meta.get("sha256") == sha):
+            ingest.csv_to_parquet(tmp_csv, parquet_path, key=key, dtype=dtype)
+    finally:
+        os.remove(tmp_csv)
+
+    _write_meta(meta_path, {
+        "url": url,
+        "format": ingest.FORMAT_VERSION,
+        "dtype": _dtype_spec(dtype),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": sha,
+    })
+    return parquet_path
+
+
+def fetch(url, key=None, cache_dir=None, timeout=TIMEOUT, dtype=None):
+    """Return the path of an up-to-date Parquet copy of the CSV at ``url``.
+
+    ``key`` names the gene column used for the side index (see ``phite.ingest``);
+    ``dtype`` is passed to ``pd.read_csv``, and may be a ``defaultdict``.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    parquet_path, meta_path = _cache_paths(url, cache_dir)
+    meta = _read_meta(meta_path)
+    if _is_local(url):
+        return _fetch_local(url, parquet_path, meta_path, meta, key, dtype)
+    return _fetch_remote(url, parquet_path, meta_path, meta, key, dtype, timeout)
+
+
+def read_csv(url, key=None, cache_dir=None, timeout=TIMEOUT, dtype=None):
+    """Like ``pd.read_csv(url, dtype=dtype)``, backed by the on-disk cache.
+
+    The dtypes differ where ingestion compacts them (see phite/ingest.py):
+    text columns come back as ``category`` and floats other than p-values as
+    ``float32``. Integer and boolean columns with gaps are streamed as
+    ``Int64`` and ``boolean`` but read back as ``pd.read_csv`` gives them,
+    ``float64`` and ``object``.
+    """
+    return pd.read_parquet(fetch(url, key=key, cache_dir=cache_dir, timeout=timeout, dtype=dtype))
+
+
+def read_genes(url, genes, key=None, cache_dir=None, timeout=TIMEOUT):
+    """The rows of ``genes`` only, indexed by gene in the order given.
+
+    Uses the gene index built when ``url`` was ingested to read just the row
+    groups holding them. Genes missing from the file are left out.
+    """
+    path = fetch(url, key=key, cache_dir=cache_dir, timeout=timeout)
+    index = ingest.read_index(path)
+    found = [g for g in genes if g in index.index]
+    frame = ingest.read_rows(path, index[found].tolist())
+    frame.index = pd.Index(found)
+    return frame
+
+
+def clear(cache_dir=None):
+    shutil.rmtree(cache_dir or CACHE_DIR, ignore_errors=True)
@@ -0,0 +1,222 @@
+"""Differential expression between any two timepoints, from raw counts.
+
+The fold-change page shows the 12 comparisons DESeq2 produced offline. This
+module recomputes a comparison in-process for any pair of timepoints in
+``figures.timepoint_labels``:
+
+1. size factors by median of ratios (DESeq2 ``estimateSizeFactors``) and
+   normalized counts (``counts(normalized = TRUE)``), computed once over all
+   samples;
+2. per-gene negative binomial dispersions: a method-of-moments estimate
+   pooled over the two groups, raised to a fitted mean-dispersion trend
+   ``a0 + a1 / mean`` (the conservative "maximum" sharing of the original
+   DESeq);
+3. a negative binomial GLM with log link and size-factor offsets, fitted by
+   vectorized Newton iterations for all genes of a chunk at once, and a
+   Wald test on the log2 fold change, with Benjamini-Hochberg ``padj``.
+
+Chunks of genes are fitted on a joblib thread pool; the counts matrix is
+shared, not copied. Results use DESeq2's column names. Unlike DESeq2 there is
+no subject (paired) term, no fold-change shrinkage and no Cook's distance
+filtering, so numbers will differ slightly from the precomputed tables.
+
+``counts_url`` holds raw counts with genes as rows (first column gene
+symbol, one column per sample). ``samples_url`` maps each sample to its
+timepoint code (``sample`` and ``timepoint`` columns).
+"""
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import norm
+
+CHUNKSIZE = 5000
+MAX_ITER = 50
+TOL = 1e-8
+# DESeq2 caps coefficients at 30 on the log2 scale; groups with no counts hit it
+MAX_LOG_MEAN = 30 * np.log(2)
+MIN_DISPERSION = 1e-8
+MAX_DISPERSION = 10.0
+RESULT_COLUMNS = ["baseMean", "log2FoldChange", "lfcSE", "stat", "pvalue", "padj"]
+
+
+def size_factors(counts):
+    """Median-of-ratios size factor of each sample (column) of ``counts``."""
+    with np.errstate(divide="ignore"):
+        log_counts = np.log(counts)
+    log_geo_means = log_counts.mean(axis=1)
+    usable = np.isfinite(log_geo_means)
+    if not usable.any():
+        raise ValueError("every gene has a zero count in some sample; cannot estimate size factors")
+    return np.exp(np.median(log_counts[usable] - log_geo_means[usable, None], axis=0))
+
+
+class CountData:
+    def __init__(self, counts, genes, samples, timepoints):
+        self.counts = np.asarray(counts, dtype=np.float64)
+        self.genes = pd.Index(genes, dtype=object)
+        self.samples = pd.Index(samples, dtype=object)
+        self.timepoints = np.asarray(timepoints, dtype=object)
+        if self.counts.shape != (len(self.genes), len(self.samples)):
+            raise ValueError(f"counts shape {self.counts.shape} does not match "
+                             f"{len(self.genes)} genes x {len(self.samples)} samples")
+        self.size_factors = size_factors(self.counts)
+        self.normalized = self.counts / self.size_factors
+
+    @classmethod
+    def from_frames(cls, counts, samples, gene_col="genesymbol", sample_col="sample", timepoint_col="timepoint"):
+        """Build from a genes x samples count frame and a sample sheet.
+
+        Samples missing from the sheet are ignored; duplicated gene symbols
+        keep their first row.
+        """
+        counts = counts.drop_duplicates(subset=gene_col, keep="first")
+        sheet = samples.astype({sample_col: str}).set_index(sample_col)[timepoint_col]
+        columns = [c for c in counts.columns if c != gene_col and str(c) in sheet.index]
+        if not columns:
+            raise ValueError("no count column matches a sample in the sample sheet")
+        return cls(
+            counts[columns].to_numpy(dtype=np.float64),
+            counts[gene_col].astype(str).to_numpy(),
+            [str(c) for c in columns],
+            sheet.loc[[str(c) for c in columns]].astype(str).to_numpy(),
+        )
+
+    def available_timepoints(self):
+        return list(dict.fromkeys(self.timepoints))
+
+    def group(self, timepoint):
+        """Column positions of the samples taken at ``timepoint``."""
+        return np.flatnonzero(self.timepoints == timepoint)
+
+
+def _moments_dispersion(normalized, size_factors):
+    # var(y / s) = q / s + alpha q^2 for a negative binomial with mean s q
+    n = normalized.shape[1]
+    mean = normalized.mean(axis=1)
+    var = normalized.var(axis=1, ddof=1) if n > 1 else np.zeros_like(mean)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        alpha = (var - mean * np.mean(1 / size_factors)) / mean ** 2
+    return np.where(mean > 0, alpha, np.nan), n - 1
+
+
+def gene_dispersions(data, positions):
+    """Method-of-moments dispersions pooled over the sample groups in ``positions``."""
+    total = weight = 0
+    for pos in positions:
+        alpha, df = _moments_dispersion(data.normalized[:, pos], data.size_factors[pos])
+        if df > 0:
+            total = total + df * np.nan_to_num(alpha)
+            weight += df
+    if not weight:
+        raise ValueError("need at least two samples in one of the groups to estimate dispersion")
+    return np.clip(total / weight, MIN_DISPERSION, MAX_DISPERSION)
+
+
+def dispersion_trend(base_mean, alpha, iterations=10):
+    """Fit ``alpha ~ a0 + a1 / base_mean``; returns ``(a0, a1)``.
+
+    Genes far from the current fit are dropped and the fit repeated, as
+    DESeq2's parametric fit does.
+    """
+    keep = (base_mean > 0) & (alpha > 100 * MIN_DISPERSION)
+    coef = np.array([np.median(alpha[keep]) if keep.any() else 0.1, 0.0])
+    for _ in range(iterations):
+        if keep.sum() < 3:
+            break
+        design = np.column_stack([np.ones(keep.sum()), 1 / base_mean[keep]])
+        fitted, *_ = np.linalg.lstsq(design, alpha[keep], rcond=None)
+        if (fitted <= 0).any():
+            break
+        ratio = alpha / (fitted[0] + fitted[1] / np.maximum(base_mean, 1e-8))
+        new_keep = (base_mean > 0) & (ratio > 1e-4) & (ratio < 15)
+        converged = np.allclose(fitted, coef, rtol=1e-6)
+        coef = fitted
+        if converged or (new_keep == keep).all():
+            break
+        keep = new_keep
+    return float(coef[0]), float(coef[1])
+
+
+def _fit_group(y, s, alpha):
+    # log of each gene's mean normalized count in one group, and its Fisher information
+    q = (y / s).mean(axis=1)
+    beta = np.log(np.maximum(q, np.exp(-MAX_LOG_MEAN)))
+    a = alpha[:, None]
+    for _ in range(MAX_ITER):
+        mu = s * np.exp(beta)[:, None]
+        denom = 1 + a * mu
+        score = ((y - mu) / denom).sum(axis=1)
+        info = (mu * (1 + a * y) / denom ** 2).sum(axis=1)
+        updated = np.clip(beta + score / info, -MAX_LOG_MEAN, MAX_LOG_MEAN)
+        change = np.nanmax(np.abs(updated - beta), initial=0)
+        beta = updated
+        if change < TOL:
+            break
+    mu = s * np.exp(beta)[:, None]
+    return beta, (mu / (1 + a * mu)).sum(axis=1)
+
+
+def _test_chunk(data, rows, numerator, denominator, alpha):
+    counts = data.counts[rows]
+    num_beta, num_info = _fit_group(counts[:, numerator], data.size_factors[numerator], alpha)
+    den_beta, den_info = _fit_group(counts[:, denominator], data.size_factors[denominator], alpha)
+    log2_fc = (num_beta - den_beta) / np.log(2)
+    se = np.sqrt(1 / num_info + 1 / den_info) / np.log(2)
+    return log2_fc, se
+
+
+def adjust_pvalues(pvalues):
+    """Benjamini-Hochberg adjusted p-values; NaN inputs stay NaN."""
+    pvalues = np.asarray(pvalues, dtype=np.float64)
+    padj = np.full_like(pvalues, np.nan)
+    tested = np.flatnonzero(~np.isnan(pvalues))
+    if len(tested):
+        order = tested[np.argsort(pvalues[tested])]
+        ranked = pvalues[order] * len(tested) / np.arange(1, len(tested) + 1)
+        padj[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1)
+    return padj
+
+
+def compare(data, numerator, denominator, chunksize=CHUNKSIZE, n_jobs=-1):
+    """Test ``numerator`` against ``denominator`` timepoint for every gene.
+
+    Returns a frame indexed by gene with ``RESULT_COLUMNS``; a positive
+    ``log2FoldChange`` means higher expression at ``numerator``. Genes with no
+    counts in either group get NaN statistics, as in DESeq2.
+    """
+    if numerator == denominator:
+        raise ValueError("numerator and denominator must be different timepoints")
+    num, den = data.group(numerator), data.group(denominator)
+    for timepoint, pos in ((numerator, num), (denominator, den)):
+        if not len(pos):
+            raise ValueError(f"no samples for timepoint {timepoint!r}")
+
+    both = np.concatenate([num, den])
+    base_mean = data.normalized[:, both].mean(axis=1)
+    alpha = gene_dispersions(data, [num, den])
+    a0, a1 = dispersion_trend(base_mean, alpha)
+    alpha = np.maximum(alpha, a0 + a1 / np.maximum(base_mean, 1e-8))
+
+    chunks = [slice(i, i + chunksize) for i in range(0, len(data.genes), chunksize)]
+    # threads: the NumPy work releases the GIL and the counts matrix stays shared
+    fitted = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(_test_chunk)(data, rows, num, den, alpha[rows]) for rows in chunks
+    )
+    log2_fc = np.concatenate([f[0] for f in fitted]) if fitted else np.empty(0)
+    se = np.concatenate([f[1] for f in fitted]) if fitted else np.empty(0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stat = log2_fc / se
+    expressed = base_mean > 0
+    stat[~expressed] = np.nan
+    log2_fc[~expressed] = se[~expressed] = np.nan
+    pvalue = 2 * norm.sf(np.abs(stat))
+
+    return pd.DataFrame({
+        "baseMean": base_mean,
+        "log2FoldChange": log2_fc,
+        "lfcSE": se,
+        "stat": stat,
+        "pvalue": pvalue,
+        "padj": adjust_pvalues(pvalue),
+    }, index=data.genes)
@@ -0,0 +1,334 @@
+"""Figure builders for the gene pages.
+
+Kept outside the page script so they can be reused and benchmarked without
+running Streamlit.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+timepoint_labels = {
+    "w0pre": "Week 0 Pre",
+    "w0h3": "Week 0 hour 3",
+    "w0h24": "Week 0 hour 24",
+    "w12pre": "Week 12 Pre",
+    "w12h3": "Week 12 hour 3",
+    "w12h24": "Week 12 hour 24",
+    "w16rest": "Week 16 Rest",
+}
+
+def process_df(gene, df):
+    g = df[df["genesymbol"] == gene].squeeze()
+    fc_cols = [c for c in df.columns if c.startswith("log2FC_")]
+    padj_cols = [c for c in df.columns if c.startswith("padj_")]
+
+    plot_df = pd.DataFrame({
+        "comparison": [c.replace("log2FC_", "") for c in fc_cols],
+        "log2FC": [g[c] for c in fc_cols],
+        "padj": [g[p] for p in padj_cols],
+    })
+    return plot_df
+
+def format_comparison_label(comp):
+    # Split into parts like "w0h3" and "w0pre"
+    parts = comp.split("_vs_")
+    if len(parts) != 2:
+        return comp  # fallback for unexpected cases
+
+    left, right = parts
+    global timepoint_labels
+    left_label = timepoint_labels.get(left, left)
+    right_label = timepoint_labels.get(right, right)
+
+    return f"{left_label} vs {right_label}"
+
+
+comparison_label_map = {
+    comp: format_comparison_label(comp)
+    for comp in [
+        'w0h3_vs_w0pre', 'w0h24_vs_w0pre', 'w12pre_vs_w0pre',
+        'w12h3_vs_w0pre', 'w12h24_vs_w0pre', 'w16rest_vs_w0pre',
+        'w12h3_vs_w12pre', 'w12h24_vs_w12pre', 'w16rest_vs_w12pre',
+        'w0h24_vs_w0h3', 'w12h24_vs_w12h3', 'w16rest_vs_w12h24'
+    ]
+}
+
+# Create base bar plot
+def generateBar(plot_df, gene):
+
+    colors = ["#d62728" if fc > 0 else "#1f77b4" for fc in plot_df["log2FC"]]
+
+    significance = []
+    for i, row in plot_df.iterrows():
+        # [0.05 - 0.01) *
+        # [0.01 - 0.001) **
+        # [0.001 - 0 ***)
+        if row["padj"] < 0.05:
+            if row["padj"] <= 0.001:
+                significance.append("***")
+            elif row["padj"] <= 0.01:
+                significance.append("**")
+            else:
+                significance.append("*")
+        else:
+            significance.append(" ")
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=plot_df["comparison"],
+        y=plot_df["log2FC"],
+        name="",
+        showlegend=False,
+        hovertemplate="<b>%{x}</b><br>log2FC = %{y:.2f}<br>padj = %{customdata:.5f}",
+        customdata=plot_df["padj"],
+        marker_color=colors,
+        text=significance,
+        textfont=dict(
+            size=18,  # Set the desired font size
+            color='black',
+            family="Arial Black"
+        ),
+        textposition="outside"
+    ))
+
+    ymin, ymax = plot_df["log2FC"].min(), plot_df["log2FC"].max()
+    yrange = ymax - ymin
+    fig.update_yaxes(range=[ymin - 0.15 * yrange, ymax + 0.15 * yrange])
+
+    fig.update_layout(
+        title=f"Fold Change Across Time Points for {gene}",
+        xaxis_title="Timepoints",
+        yaxis_title="log2FC",
+        template="plotly_white",
+        showlegend=False
+    )
+
+    fig.update_xaxes(
+        ticktext=plot_df["comparison"],
+        tickvals=plot_df["comparison"],
+        tickfont=dict(size=12)
+    )
+    fig.update_xaxes(linewidth=2, linecolor='rgb(231, 234, 240)', mirror=True,
+                     showline=True)
+
+    fig.update_yaxes(linewidth=2, linecolor='rgb(231, 234, 240)', mirror=True,
+                     showline=True)
+
+    return fig
+
+def generateTable(plot_df, gene):
+    fig_table = go.Figure(
+        data=[go.Table(
+            header=dict(
+                values=["Time Points", "Fold Change (log2FC)", "Adjusted P-value"],
+                fill_color="#1f77b4",
+                align="center",  # horizontal center
+                font=dict(color="white", size=15)
+            ),
+            cells=dict(
+                values=[
+                    #[comparison_label_map.get(x, x) for x in plot_df["comparison"]],
+                    plot_df["comparison"],
+                    [f"{x:.2f}" for x in plot_df["log2FC"]],
+                    [f"{x:.2e}" for x in plot_df["padj"]]
+                ],
+                fill_color=[
+                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(plot_df))]
+                    for _ in range(3)  # one list per column
+                ],
+                align="center",  # horizontal center
+                font=dict(size=15),
+                height=30  # set row height for all cells
+            )
+        )]
+    )
+
+    fig_table.update_layout(
+        title=f"Fold Change and Adjusted P-values for {gene}",
+        template="plotly_white",
+        margin=dict(t=40, l=20, r=20, b=20)
+    )
+    return fig_table
+
+
+def generateStatsTable(df, gene):
+
+    stats_values = [
+        f"{df['mean']:.2f}",
+        f"{df['min']:.2f}",
+        f"{df['max']:.2f}",
+        f"{df['std']:.2f}",
+    ]
+    stats_labels = ["Mean", "Min", "Max", "Standard Deviation"]
+
+    fig_table = go.Figure(
+        data=[go.Table(
+            header=dict(
+                values=["Statistic", "Value"],
+                fill_color="#1f77b4",
+                align="center",
+                font=dict(color="white", size=15)
+            ),
+            cells=dict(
+                values=[stats_labels, stats_values],
+                fill_color=[
+                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(stats_labels))],
+                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(stats_values))]
+                ],
+                align="center",
+                font=dict(size=15),
+                height=30
+            )
+        )]
+    )
+
+    fig_table.update_layout(
+        title=f"Week 0 Baseline (w0pre) {gene} Expression",
+        template="plotly_white",
+        margin=dict(t=40, l=20, r=20, b=20)
+    )
+    return fig_table
+
+
+def generateCorrTable(df, gene):
+    metrics = {
+        "csa": "Myofibrils Size",
+        "torque": "Strength (Peak Torque)",
+        "contacts": "Vascular (contacts) Changes",
+        "vo2": "Vo2peak"
+    }
+
+    corr_values = [f"{df[f'{m}_corr']:+.2f}" for m in metrics]
+    p_values = [f"{df[f'{m}_p_val']:.3f}" for m in metrics]
+    corr_labels = [f"Correlation with {name}" for name in metrics.values()]
+
+    fig_table = go.Figure(
+        data=[go.Table(
+            header=dict(
+                values=["Statistic", "Correlation", "P-vals"],
+                fill_color="#1f77b4",
+                align="center",
+                font=dict(color="white", size=15)
+            ),
+            cells=dict(
+                values=[corr_labels, corr_values, p_values],
+                fill_color=[
+                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(corr_labels))],
+                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(corr_values))],
+                    ["#f9f9f9" if i % 2 == 0 else "#ffffff" for i in range(len(p_values))]
+                ],
+                align="center",
+                font=dict(size=15),
+                height=30
+            )
+        )]
+    )
+
+    fig_table.update_layout(
+        title=f"Various Correlations for {gene}",
+        template="plotly_white",
+        margin=dict(t=40, l=20, r=20, b=20)
+    )
+    return fig_table
+
+
+def generateVolcano(results, comparison, padj_cutoff=0.05):
+    # one WebGL trace per class; Scattergl keeps tens of thousands of genes responsive
+    results = results.dropna(subset=["log2FoldChange", "pvalue"])
+    neg_log_p = -np.log10(np.maximum(results["pvalue"].to_numpy(), np.finfo(float).tiny))
+    significant = (results["padj"] < padj_cutoff).to_numpy()
+    up = significant & (results["log2FoldChange"] > 0).to_numpy()
+    down = significant & ~up
+
+    fig = go.Figure()
+    for name, mask, color in [("Not significant", ~significant, "lightgrey"),
+                              ("Up", up, "#d62728"),
+                              ("Down", down, "#1f77b4")]:
+        fig.add_trace(go.Scattergl(
+            x=results["log2FoldChange"].to_numpy()[mask],
+            y=neg_log_p[mask],
+            mode="markers",
+            name=f"{name} ({mask.sum():,})",
+            text=results.index.to_numpy()[mask],
+            customdata=results["padj"].to_numpy()[mask],
+            hovertemplate="<b>%{text}</b><br>log2FC = %{x:.2f}<br>padj = %{customdata:.2e}",
+            marker=dict(size=5, color=color),
+        ))
+
+    fig.update_layout(
+        title=f"Differential Expression: {format_comparison_label(comparison)}",
+        xaxis_title="log2FC",
+        yaxis_title="-log10(p-value)",
+        template="plotly_white",
+        legend_title="",
+        height=600,
+    )
+    return fig
+
+
+def generateCohortDashboard(summary, outcome, units):
+    # every trace is drawn from phite.cohort.summarize output, never from per-participant data
+    label = f"{outcome} ({units})"
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=(
+            f"Distribution of predicted {outcome} (n = {summary['n']:,})",
+            f"Ranked predictions: {summary['responders']:,} responders, "
+            f"{summary['non_responders']:,} non-responders",
+            "Cohort against the validation set",
+            "Validation set: predicted vs observed",
+        ),
+        vertical_spacing=0.14,
+    )
+
+    density = summary["density"]
+    width = summary["edges"][1] - summary["edges"][0]
+    fig.add_trace(go.Bar(x=summary["centers"], y=density["cohort"], width=width, name="Cohort (predicted)",
+                         marker_color="#d62728", opacity=0.6), row=1, col=1)
+    for name, key, color in [("Validation (predicted)", "validation_predicted", "red"),
+                             ("Validation (observed)", "validation_observed", "blue")]:
+        fig.add_trace(go.Scatter(x=summary["centers"], y=density[key], name=name, mode="lines",
+                                 line=dict(color=color, shape="hvh", width=2)), row=1, col=1)
+
+    responder = summary["ranked"] > summary["threshold"]
+    for name, mask, color in [("Responders", responder, "green"), ("Non-responders", ~responder, "grey")]:
+        fig.add_trace(go.Scattergl(x=summary["rank_pct"][mask], y=summary["ranked"][mask], name=name,
+                                   mode="markers", marker=dict(size=5, color=color)), row=1, col=2)
+    fig.add_hline(y=summary["threshold"], line_dash="dash", line_color="black", row=1, col=2)
+
+    boxes = summary["boxes"]
+    fig.add_trace(go.Box(
+        x=list(boxes),
+        q1=[b["q1"] for b in boxes.values()],
+        median=[b["median"] for b in boxes.values()],
+        q3=[b["q3"] for b in boxes.values()],
+        lowerfence=[b["lowerfence"] for b in boxes.values()],
+        upperfence=[b["upperfence"] for b in boxes.values()],
+        mean=[b["mean"] for b in boxes.values()],
+        name="Quartiles", marker_color="#1f77b4", showlegend=False,
+    ), row=2, col=1)
+
+    validation = summary["validation"]
+    low = min(validation["predicted"].min(), validation["observed"].min())
+    high = max(validation["predicted"].max(), validation["observed"].max())
+    fig.add_trace(go.Scattergl(x=validation["observed"], y=validation["predicted"], mode="markers",
+                               name="Validation participants", marker=dict(size=8, color="blue")), row=2, col=2)
+    fig.add_trace(go.Scatter(x=[low, high], y=[low, high], mode="lines", name="Perfect prediction",
+                             line=dict(color="black", dash="dot")), row=2, col=2)
+
+    fig.update_xaxes(title_text=label, row=1, col=1)
+    fig.update_yaxes(title_text="Density", row=1, col=1)
+    fig.update_xaxes(title_text="Rank (percentile, largest change first)", row=1, col=2)
+    fig.update_yaxes(title_text=label, row=1, col=2)
+    fig.update_yaxes(title_text=label, row=2, col=1)
+    fig.update_xaxes(title_text=f"Observed {label}", row=2, col=2)
+    fig.update_yaxes(title_text=f"Predicted {label}", row=2, col=2)
+    fig.update_layout(
+        template="plotly_white",
+        height=850,
+        legend_title="",
+        barmode="overlay",
+        margin=dict(l=20, r=20, t=60, b=20),
+    )
+    return fig
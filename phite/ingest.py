@@ -0,0 +1,212 @@
+"""Streaming CSV -> Parquet ingestion with compact dtypes.
+
+The CSV is read ``CHUNKSIZE`` rows at a time and each chunk is appended to
+the Parquet file as its own row group, so peak memory depends on the chunk
+size rather than on the file size. Integer and boolean columns keep their
+types, other numeric columns are stored as float32 (p-value columns stay
+float64 since they underflow float32) and text columns such as gene symbols
+are dictionary encoded, which pandas reads back as ``category``. Column types
+widen as chunks arrive; if a later chunk does not fit, the row groups already
+written are recast to the wider schema.
+
+While the chunks stream past, a gene -> row index is collected and written
+next to the data file, so ``read_index`` and ``read_rows`` can fetch a few
+genes without reading the whole table.
+"""
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FORMAT_VERSION = 2
+CHUNKSIZE = 20_000
+PVALUE_PREFIXES = ("padj_", "pvalue_", "pval_")
+PVALUE_SUFFIXES = ("_p_val", "_padj", "_pvalue")
+
+
+def _temp_path(dest):
+    fd, path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)),
+                                prefix=os.path.basename(dest) + ".", suffix=".tmp")
+    os.close(fd)
+    return path
+
+
+def index_path(parquet_path):
+    return parquet_path[:-len(".parquet")] + ".genes.parquet"
+
+
+def _is_pvalue(col):
+    col = str(col)
+    return col.startswith(PVALUE_PREFIXES) or col.endswith(PVALUE_SUFFIXES)
+
+
+def _kind(series):
+    """Narrowest of null < bool < int < float < text that holds ``series``."""
+    values = series.dropna()
+    if values.empty:
+        return "null"
+    if pd.api.types.is_bool_dtype(series) or (
+            series.dtype == object and values.map(type).eq(bool).all()):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        # integer columns with gaps are read as float64
+        whole = (values == values.round()).all() and values.abs().max() < 2 ** 53
+        return "int" if whole else "float"
+    return "text"
+
+
+def _widen(a, b):
+    if a == b or b == "null":
+        return a
+    if a == "null":
+        return b
+    if {a, b} <= {"int", "float"}:
+        return "float"
+    return "text"
+
+
+def _arrow_type(col, kind):
+    if kind == "text":
+        return pa.dictionary(pa.int32(), pa.string())
+    if _is_pvalue(col) and kind in ("int", "float", "null"):
+        return pa.float64()
+    if kind == "bool":
+        return pa.bool_()
+    if kind == "int":
+        return pa.int64()
+    return pa.float32()
+
+
+def _schema(kinds):
+    return pa.schema([pa.field(col, _arrow_type(col, kind)) for col, kind in kinds.items()])
+
+
+def _pandas_dtypes(schema):
+    dtypes = {}
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            dtypes[field.name] = "string"
+        elif field.type == pa.bool_():
+            dtypes[field.name] = "boolean"
+        elif field.type == pa.int64():
+            dtypes[field.name] = "Int64"
+        else:
+            dtypes[field.name] = "float64" if field.type == pa.float64() else "float32"
+    return dtypes
+
+
+def _default_key(schema):
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            return field.name
+    return None
+
+
+def iter_chunks(source, chunksize=CHUNKSIZE, dtype=None):
+    """Yield ``(schema, chunk)`` pairs with the compact dtypes already applied.
+
+    Column kinds accumulate over the chunks read so far, so the schema only
+    ever widens (int to float, anything to text); a column that is empty in
+    the first chunk takes its type from the first chunk that has values.
+    ``dtype`` is passed to ``pd.read_csv`` and fixes the kind of the columns it names.
+    """
+    reader = pd.read_csv(source, chunksize=chunksize, dtype=dtype)
+    kinds = {}
+    for chunk in reader:
+        kinds = {col: _widen(kinds.get(col, "null"), _kind(chunk[col])) for col in chunk.columns}
+        schema = _schema(kinds)
+        yield schema, chunk.astype(_pandas_dtypes(schema))
+
+
+def _rewrite(path, schema):
+    """A writer for ``schema`` at a new temp path, holding ``path``'s row groups recast to it.
+
+    Copies one row group at a time and removes ``path``; returns ``(writer, new_path)``.
+    """
+    old = pq.ParquetFile(path)
+    new = _temp_path(path)
+    writer = pq.ParquetWriter(new, schema)
+    try:
+        dtypes = _pandas_dtypes(schema)
+        for i in range(old.num_row_groups):
+            frame = old.read_row_group(i).to_pandas().astype(dtypes)
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+    except BaseException:
+        writer.close()
+        os.remove(new)
+        raise
+    os.remove(path)
+    return writer, new
+
+
+def csv_to_parquet(source, dest, key=None, chunksize=CHUNKSIZE, dtype=None):
+    """Stream ``source`` into ``dest`` and write its gene index; returns the row count."""
+    # unique temp names: concurrent cold loads of one URL must not share files
+    tmp, tmp_index = _temp_path(dest), _temp_path(index_path(dest))
+    writer = None
+    genes, rows = [], []
+    n = 0
+    try:
+        try:
+            for schema, chunk in iter_chunks(source, chunksize, dtype):
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, schema)
+                    key = key or _default_key(schema)
+                elif not schema.equals(writer.schema):
+                    # a later chunk did not fit the types seen so far
+                    writer.close()
+                    writer, tmp = _rewrite(tmp, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                if key is not None:
+                    genes.extend(chunk[key].tolist())
+                    rows.extend(range(n, n + len(chunk)))
+                n += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            # header-only or empty file: keep whatever columns pandas can see
+            pd.read_csv(source, dtype=dtype).to_parquet(tmp, index=False)
+        pd.DataFrame({"gene": pd.Series(genes, dtype="string"), "row": pd.Series(rows, dtype="int64")}) \
+            .to_parquet(tmp_index, index=False)
+        os.replace(tmp, dest)
+        os.replace(tmp_index, index_path(dest))
+    finally:
+        for path in (tmp, tmp_index):
+            if os.path.exists(path):
+                os.remove(path)
+    return n
+
+
+def read_index(parquet_path):
+    """Return the gene -> first row position mapping built during ingestion."""
+    index = pd.read_parquet(index_path(parquet_path))
+    index = index.dropna(subset=["gene"]).drop_duplicates("gene")
+    return pd.Series(index["row"].to_numpy(), index=index["gene"].astype(object))
+
+
+def read_rows(parquet_path, rows):
+    """Read only the row groups holding ``rows`` (row positions) from a Parquet file."""
+    pf = pq.ParquetFile(parquet_path)
+    bounds, start = [], 0
+    for i in range(pf.num_row_groups):
+        size = pf.metadata.row_group(i).num_rows
+        bounds.append((i, start, start + size))
+        start += size
+
+    frames = []
+    for group, lo, hi in bounds:
+        wanted = sorted({r - lo for r in rows if lo <= r < hi})
+        if wanted:
+            frame = pf.read_row_group(group).to_pandas().iloc[wanted]
+            frame.index = [lo + r for r in wanted]
+            frames.append(frame)
+    if not frames:
+        return pf.schema_arrow.empty_table().to_pandas()
+    # row groups come back in file order; return rows in the order asked for
+    return pd.concat(frames).loc[[r for r in rows if 0 <= r < start]].reset_index(drop=True)
@@ -0,0 +1,26 @@
+"""Cached loaders shared by several pages.
+
+Streamlit keys a cached function by its module and qualified name, so two
+pages defining the same loader hold two copies. A loader defined here is
+cached once per process for every page that imports it.
+"""
+import streamlit as st
+
+from phite import datasets, manifest, profile
+
+MODEL_MANIFESTS = {
+    "power": "power_predict.manifest.json",
+    "vo2": "vo2_predict.manifest.json",
+}
+
+
+# fold change, baseline stats, correlations and model membership joined once
+# per process into a single gene-keyed table, see phite/profile.py
+@st.cache_resource
+def load_profiles():
+    return profile.build_profiles(
+        datasets.read_csv(st.secrets["data_url"], key="genesymbol"),
+        datasets.read_csv(st.secrets["stats_url"], key="Unnamed: 0"),
+        datasets.read_csv(st.secrets["corr_url"], key="Unnamed: 0"),
+        {name: manifest.load(path)["genes"] for name, path in MODEL_MANIFESTS.items()},
+    )
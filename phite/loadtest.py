@@ -0,0 +1,346 @@
+"""Load-testing harness for concurrent Streamlit sessions.
+
+Simulates N users hitting the pages at the same time, headlessly, through
+Streamlit's ``AppTest``. Every simulated user holds its own ``AppTest``
+instances, i.e. its own session state, while ``st.cache_data`` /
+``st.cache_resource`` are shared by the process just as they are on a real
+server. Data comes from ``phite.synthetic`` so the run is offline::
+
+    python -m phite.loadtest --users 30 --duration 60 --genes 20000
+
+The report lists per-action latency percentiles and errors, process CPU and
+RSS sampled during the run (the process plays the server here), the payload
+cache hit ratio, and per-step timings collected by ``phite.metrics``.
+The ``download`` action is timed from the click until a rerun shows the
+download buttons, so it covers the background export.
+
+``AppTest`` installs and clears a process-wide runtime around every run,
+which breaks when several runs overlap; ``shared_runtime()`` keeps the last
+installed runtime visible to all script threads for the duration of a test.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from phite import datasets, metrics, serving, synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS = ["power_predict.npz", "vo2_predict.npz"]
+PAGES = {
+    "fold_change": "pages/1_Gene_Fold_Change_Post_Exercise.py",
+    "correlation": "pages/2_Correlation_Fold_Change.py",
+    "power": "pages/3_Predicting_PowerPeak_Change.py",
+    "vo2": "pages/4_Predicting_VO2Peak_Change.py",
+}
+DOWNLOAD_POLL_S = 0.2
+DEFAULT_MIX = "lookup=6,correlation=2,download=1,predict_power=1,predict_vo2=1"
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+@contextlib.contextmanager
+def shared_runtime():
+    from streamlit.runtime import Runtime
+
+    original_instance, original_exists = Runtime.__dict__["instance"], Runtime.__dict__["exists"]
+    last = []
+
+    def instance(cls):
+        current = cls._instance
+        if current is not None:
+            last[:] = [current]
+            return current
+        if last:
+            return last[0]
+        return original_instance.__func__(cls)
+
+    def exists(cls):
+        return cls._instance is not None or bool(last)
+
+    Runtime.instance, Runtime.exists = classmethod(instance), classmethod(exists)
+    try:
+        yield
+    finally:
+        Runtime.instance, Runtime.exists = original_instance, original_exists
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, action, seconds, ok):
+        with self._lock:
+            self.samples[action].append(seconds)
+            if not ok:
+                self.errors[action] += 1
+
+    def summary(self, wall_s):
+        out = {}
+        for action, values in sorted(self.samples.items()):
+            ms = np.asarray(values) * 1000
+            out[action] = {
+                "count": len(ms),
+                "errors": self.errors[action],
+                "per_s": len(ms) / wall_s if wall_s else 0.0,
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "max_ms": float(ms.max()),
+            }
+        return out
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is the peak, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Sampler(threading.Thread):
+    """Sample process CPU % and RSS every ``interval`` seconds."""
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.cpu_pct = []
+        self.rss = []
+        self._done = threading.Event()
+
+    def run(self):
+        last_cpu, last_t = _cpu_seconds(), time.perf_counter()
+        while not self._done.wait(self.interval):
+            cpu, t = _cpu_seconds(), time.perf_counter()
+            self.cpu_pct.append(100 * (cpu - last_cpu) / (t - last_t))
+            self.rss.append(_rss_bytes())
+            last_cpu, last_t = cpu, t
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def summary(self):
+        if not self.rss:
+            return {}
+        return {
+            "cpu_pct_mean": float(np.mean(self.cpu_pct)),
+            "cpu_pct_max": float(np.max(self.cpu_pct)),
+            "rss_mb_start": self.rss[0] / 1e6,
+            "rss_mb_max": max(self.rss) / 1e6,
+            "rss_mb_end": self.rss[-1] / 1e6,
+        }
+
+
+class User:
+    def __init__(self, uid, secrets, genes, recorder, timeout, seed):
+        self.uid = uid
+        self.secrets = secrets
+        self.genes = genes
+        self.recorder = recorder
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.apps = {}
+
+    def _timed(self, action, at, step):
+        t0 = time.perf_counter()
+        ok = True
+        try:
+            step()
+            ok = not at.exception
+        except Exception:
+            ok = False
+        self.recorder.add(action, time.perf_counter() - t0, ok)
+
+    def app(self, page):
+        if page not in self.apps:
+            from streamlit.testing.v1 import AppTest
+
+            at = AppTest.from_file(os.path.join(ROOT, PAGES[page]), default_timeout=self.timeout)
+            for key, value in self.secrets.items():
+                at.secrets[key] = value
+            self._timed(f"open_{page}", at, at.run)
+            self.apps[page] = at
+        return self.apps[page]
+
+    def pick_gene(self):
+        # a few popular genes get most of the traffic, as in a workshop
+        weights = [1 / (i + 1) for i in range(len(self.genes))]
+        return self.rng.choices(self.genes, weights=weights)[0]
+
+    def lookup(self):
+        at = self.app("fold_change")
+        self._timed("lookup", at, lambda: at.text_input[0].set_value(self.pick_gene()).run())
+
+    def correlation(self):
+        at = self.app("correlation")
+        self._timed("correlation", at, lambda: at.text_input[0].set_value(self.pick_gene()).run())
+
+    def download(self):
+        at = self.app("fold_change")
+        buttons = [b for b in at.button if b.label == "Generate Download"]
+        if not buttons:
+            # downloads already prepared for this gene; switch gene first
+            self.lookup()
+            buttons = [b for b in at.button if b.label == "Generate Download"]
+        if not buttons:
+            return
+
+        def step():
+            # the export runs in the background; the download is ready once
+            # a rerun shows the download buttons
+            deadline = time.perf_counter() + self.timeout
+            buttons[0].click().run()
+            while not at.get("download_button"):
+                if at.exception or at.error or time.perf_counter() > deadline:
+                    raise TimeoutError("download buttons did not appear")
+                time.sleep(DOWNLOAD_POLL_S)
+                at.run()
+
+        self._timed("download", at, step)
+
+    def _predict(self, page):
+        at = self.app(page)
+
+        def step():
+            [b for b in at.button if b.label == "Generate Values"][0].click().run()
+            [b for b in at.button if b.label == "Submit"][0].click().run()
+
+        self._timed(f"predict_{page}", at, step)
+
+    def predict_power(self):
+        self._predict("power")
+
+    def predict_vo2(self):
+        self._predict("vo2")
+
+    def run(self, mix, deadline, iterations, think):
+        names, weights = list(mix), list(mix.values())
+        done = 0
+        while time.perf_counter() < deadline and (iterations is None or done < iterations):
+            getattr(self, self.rng.choices(names, weights=weights)[0])()
+            done += 1
+            if think:
+                time.sleep(self.rng.expovariate(1 / think))
+
+
+def _cache_summary(path):
+    if not os.path.exists(path):
+        return {}, {}
+    records = metrics.read(path)
+    caches = {}
+    for rec in records:
+        caches.update(rec.get("caches", {}))
+    return caches, metrics.aggregate(records)
+
+
+def run(users, duration, iterations, n_genes, mix, think=0.0, ramp=0.0, timeout=120, seed=0):
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_genes = [g for path in MODELS for g in serving.load(path).features]
+        secrets = synthetic.write_all(work_dir, n_genes, extra_genes=["PPARD"] + model_genes, seed=seed)
+        genes = synthetic.gene_names(n_genes, ["PPARD"])[:500]
+        datasets.CACHE_DIR = os.path.join(work_dir, "cache")
+        metrics.METRICS_FILE = os.path.join(work_dir, "metrics.jsonl")
+
+        recorder = Recorder()
+        sampler = Sampler()
+        with shared_runtime():
+            sampler.start()
+            start = time.perf_counter()
+            deadline = start + duration
+            threads = []
+            for uid in range(users):
+                user = User(uid, secrets, genes, recorder, timeout, seed + uid)
+                t = threading.Thread(target=user.run, args=(mix, deadline, iterations, think), daemon=True)
+                threads.append(t)
+                t.start()
+                if ramp:
+                    time.sleep(ramp / users)
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - start
+            sampler.stop()
+
+        caches, steps = _cache_summary(metrics.METRICS_FILE)
+        return {
+            "config": {"users": users, "duration_s": duration, "iterations": iterations,
+                       "genes": n_genes, "mix": mix, "think_s": think},
+            "wall_s": wall,
+            "actions": recorder.summary(wall),
+            "process": sampler.summary(),
+            "caches": caches,
+            "steps": steps,
+        }
+
+
+def report(result):
+    print(f"{result['config']['users']} users, {result['wall_s']:.1f}s wall")
+    print(f"{'action':<20}{'n':>7}{'err':>6}{'/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for action, s in result["actions"].items():
+        print(f"{action:<20}{s['count']:>7}{s['errors']:>6}{s['per_s']:>8.2f}"
+              f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    proc = result["process"]
+    if proc:
+        print(f"cpu {proc['cpu_pct_mean']:.0f}% mean / {proc['cpu_pct_max']:.0f}% max, "
+              f"rss {proc['rss_mb_start']:.0f} -> {proc['rss_mb_max']:.0f} MB peak")
+    for name, stats in result["caches"].items():
+        print(f"cache {name}: {stats.get('hit_ratio', 0):.1%} hits, {stats.get('entries')} entries, "
+              f"{stats.get('nbytes', 0) / 1e6:.1f} MB, {stats.get('evictions')} evictions")
+        if "sessions" in stats:
+            print(f"  {stats['sessions']} sessions holding artifacts, largest "
+                  f"{stats['largest_session_bytes'] / 1e6:.2f} MB of {stats['session_max_bytes'] / 1e6:.0f} MB cap")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--iterations", type=int, help="stop each user after this many actions")
+    parser.add_argument("--genes", type=int, default=20000)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="action weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between actions, seconds")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which users join")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the full result to this file")
+    args = parser.parse_args(argv)
+
+    result = run(args.users, args.duration, args.iterations, args.genes, parse_mix(args.mix),
+                 think=args.think, ramp=args.ramp, timeout=args.timeout, seed=args.seed)
+    report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
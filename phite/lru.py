@@ -0,0 +1,151 @@
+"""Thread-safe LRU cache bounded by the total size of its values.
+
+Meant to be created once per process (``st.cache_resource``) so that every
+session shares it. Sizes are measured on the pickled value unless the caller
+passes one in, and hit/miss/eviction counters are kept for monitoring.
+
+With ``ttl`` set, an entry that has not been read or written for ``ttl``
+seconds expires. Access refreshes the deadline, so LRU order is also expiry
+order and expired entries are dropped from the old end on every put.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def _sizeof(value):
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class LRUCache:
+    def __init__(self, max_bytes, sizeof=_sizeof, ttl=None, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.clock = clock
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._deadlines = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data and not self._expired(key)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is not _MISSING and self._expired(key):
+                self._discard(key)
+                self.expirations += 1
+                value = _MISSING
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._touch(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size=None):
+        """Store ``value``; returns False if it is larger than the whole cache."""
+        size = self.sizeof(value) if size is None else size
+        with self._lock:
+            self._discard(key)
+            self.expire()
+            if size > self.max_bytes:
+                return False
+            self._data[key] = value
+            self._sizes[key] = size
+            self._touch(key)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self.evict(next(iter(self._data)))
+            return True
+
+    def get_or_set(self, key, factory):
+        """Return the cached value for ``key``, building it with ``factory()`` on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, default)
+            self._discard(key)
+            return value
+
+    def evict(self, key):
+        """Drop ``key`` to make room, counting it as an eviction."""
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._discard(key)
+            self.evictions += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._deadlines.clear()
+            self.nbytes = 0
+
+    def expire(self):
+        """Drop every expired entry; returns how many were dropped."""
+        dropped = 0
+        with self._lock:
+            while self._data:
+                oldest = next(iter(self._data))
+                if not self._expired(oldest):
+                    break
+                self._discard(oldest)
+                dropped += 1
+            self.expirations += dropped
+        return dropped
+
+    def sizes(self):
+        """``{key: size}`` of the live entries, least recently used first."""
+        with self._lock:
+            self.expire()
+            return {key: self._sizes[key] for key in self._data}
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _touch(self, key):
+        if self.ttl is not None:
+            self._deadlines[key] = self.clock() + self.ttl
+
+    def _expired(self, key):
+        return self.ttl is not None and self.clock() >= self._deadlines[key]
+
+    def _discard(self, key):
+        if key in self._data:
+            del self._data[key]
+            self._deadlines.pop(key, None)
+            self.nbytes -= self._sizes.pop(key)
@@ -0,0 +1,36 @@
+"""Validation manifests written next to each trained model.
+
+A manifest records which genes a model reads, the artifacts it was saved
+to, and its cross-validated predictions, so the prediction pages can show
+results that match the shipped model instead of hardcoded numbers. See
+``phite.training`` for how manifests are produced.
+"""
+import json
+import os
+
+import numpy as np
+
+
+def path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".manifest.json"
+
+
+def r2(observed, predicted):
+    observed, predicted = np.asarray(observed, dtype=float), np.asarray(predicted, dtype=float)
+    ss_res = np.sum((observed - predicted) ** 2)
+    ss_tot = np.sum((observed - observed.mean()) ** 2)
+    return float(1 - ss_res / ss_tot) if ss_tot else float("nan")
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write(path, doc):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(doc, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+    return path
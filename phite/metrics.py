@@ -0,0 +1,300 @@
+"""Lightweight hot-path instrumentation for the Streamlit pages.
+
+A page renders inside ``with page_run(name):``, which starts a run and
+finishes it even when the script stops early (``st.rerun()`` raises). In
+between, ``timer`` (context manager or decorator) and ``cache_stats`` record
+into the current run, which is thread-local because Streamlit executes each
+session's script on its own thread. Finished runs are appended as JSON lines
+to ``METRICS_FILE`` and, when debugging is on (``PHITE_DEBUG=1`` or
+``?debug=1`` in the URL), shown in the sidebar.
+
+The file is rotated once it passes ``METRICS_MAX_BYTES``, keeping
+``METRICS_BACKUPS`` older files (``metrics.jsonl.1`` is the newest), so a
+long-running deployment holds a bounded amount of history.
+
+``python -m phite.metrics [path]`` aggregates a metrics file into
+per-page latency percentiles.
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+METRICS_FILE = os.environ.get(
+    "PHITE_METRICS_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".phite_metrics", "metrics.jsonl"),
+)
+
+METRICS_MAX_BYTES = int(os.environ.get("PHITE_METRICS_MAX_BYTES", str(64 * 1024 * 1024)))
+METRICS_BACKUPS = int(os.environ.get("PHITE_METRICS_BACKUPS", "3"))
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+class Run:
+    def __init__(self, page, session=None, task=None):
+        self.page = page
+        self.session = session_id() if session is None else session
+        self.task = task
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.caches = {}
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def task_run(self, task):
+        """A run for background ``task``, merged back with ``merge`` or written on its own."""
+        return Run(self.page, self.session, task)
+
+    def merge(self, other):
+        """Add ``other``'s records to this run; False if this run was already written."""
+        with self._lock:
+            if self.finished:
+                return False
+            for name, seconds in other.timings.items():
+                self.timings[name] += seconds
+                self.calls[name] += other.calls[name]
+            self.caches.update(other.caches)
+            return True
+
+    def to_dict(self):
+        data = {
+            "page": self.page,
+            "ts": self.started,
+            "session": self.session,
+            "total_s": self.elapsed(),
+            "timings_s": dict(self.timings),
+            "calls": dict(self.calls),
+            "caches": self.caches,
+        }
+        if self.task is not None:
+            data["task"] = self.task
+        return data
+
+
+def session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+
+def start_run(page):
+    _local.run = Run(page)
+    return _local.run
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+@contextlib.contextmanager
+def attach(run, task="task"):
+    """Record into ``run`` from another thread, e.g. a background render task.
+
+    The task records into its own run, which is merged into ``run`` when the
+    task ends. A task that outlives ``run`` (the script finished first) writes
+    its run as a separate record, tagged with ``task``.
+    """
+    previous = current_run()
+    own = run.task_run(task) if run is not None else None
+    _local.run = own
+    try:
+        yield own
+    finally:
+        _local.run = previous
+        if own is not None and not run.merge(own):
+            write(own)
+
+
+def record(name, seconds):
+    run = current_run()
+    if run is not None:
+        run.timings[name] += seconds
+        run.calls[name] += 1
+
+
+def cache_stats(name, stats):
+    """Attach a cache's ``stats()`` dict (hits, misses, hit_ratio, ...) to the run."""
+    run = current_run()
+    if run is not None:
+        run.caches[name] = dict(stats)
+
+
+class timer(contextlib.ContextDecorator):
+    """Time a block or a function into the current run under ``name``."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self._start)
+        return False
+
+
+def debug_enabled():
+    if os.environ.get("PHITE_DEBUG") == "1":
+        return True
+    try:
+        import streamlit as st
+        return st.query_params.get("debug") == "1"
+    except Exception:
+        return False
+
+
+def _rotate(path, backups):
+    # path.1 is the newest backup; the oldest one falls off the end
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    if backups:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+def write(run, path=None, max_bytes=None, backups=None):
+    path = METRICS_FILE if path is None else path
+    if not path:
+        return
+    max_bytes = METRICS_MAX_BYTES if max_bytes is None else max_bytes
+    backups = METRICS_BACKUPS if backups is None else backups
+    line = json.dumps(run.to_dict(), default=float) + "\n"
+    with _write_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        if size and size + len(line) > max_bytes:
+            _rotate(path, backups)
+        with open(path, "a") as f:
+            f.write(line)
+
+
+def render_sidebar(run):
+    import streamlit as st
+
+    data = run.to_dict()
+    with st.sidebar.expander("Timings", expanded=True):
+        st.write(f"**{data['page']}**: {data['total_s'] * 1000:.1f} ms total")
+        rows = [
+            {"step": name, "ms": round(seconds * 1000, 2), "calls": data["calls"][name]}
+            for name, seconds in sorted(data["timings_s"].items(), key=lambda kv: -kv[1])
+        ]
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        for name, stats in data["caches"].items():
+            st.write(f"cache `{name}`: {stats.get('hit_ratio', 0):.0%} hits", stats)
+
+
+def finish_run():
+    """Log the current run and show it in the sidebar when debugging."""
+    run = current_run()
+    if run is None:
+        return None
+    _local.run = None
+    with run._lock:
+        run.finished = True
+    write(run)
+    if debug_enabled():
+        render_sidebar(run)
+    return run
+
+
+@contextlib.contextmanager
+def page_run(page):
+    """Start a run for ``page`` and finish it however the script ends.
+
+    ``st.rerun()`` stops the script by raising, and the run is written anyway.
+    """
+    run = start_run(page)
+    try:
+        yield run
+    finally:
+        finish_run()
+
+
+def read(path=None, backups=None):
+    """Records from ``path`` and its rotated backups, oldest first."""
+    path = METRICS_FILE if path is None else path
+    backups = METRICS_BACKUPS if backups is None else backups
+    paths = [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]
+    records = []
+    for p in paths:
+        if os.path.exists(p):
+            with open(p) as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def aggregate(records):
+    """Per page and step: count, mean and p50/p95/p99 in milliseconds."""
+    samples = defaultdict(lambda: defaultdict(list))
+    for rec in records:
+        if "task" not in rec:
+            # a late task's total is its own duration, not a page run's
+            samples[rec["page"]]["total"].append(rec["total_s"])
+        for name, seconds in rec.get("timings_s", {}).items():
+            samples[rec["page"]][name].append(seconds)
+
+    summary = {}
+    for page, steps in samples.items():
+        summary[page] = {}
+        for name, values in steps.items():
+            ms = np.asarray(values) * 1000
+            summary[page][name] = {
+                "count": len(ms),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "p99_ms": float(np.percentile(ms, 99)),
+            }
+    return summary
+
+
+def session_memory(records):
+    """Latest artifact-store bytes per session, largest first (see phite/artifacts.py)."""
+    latest = {}
+    for rec in records:
+        stats = rec.get("caches", {}).get("artifacts")
+        if stats and "session_bytes" in stats:
+            latest[rec.get("session")] = stats["session_bytes"]
+    return dict(sorted(latest.items(), key=lambda kv: -kv[1]))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    records = read(argv[0] if argv else None)
+    summary = aggregate(records)
+    for page, steps in sorted(summary.items()):
+        print(page)
+        for name, s in sorted(steps.items(), key=lambda kv: -kv[1]["p50_ms"]):
+            print(f"  {name:<24} n={s['count']:<6} p50={s['p50_ms']:9.2f}ms "
+                  f"p95={s['p95_ms']:9.2f}ms p99={s['p99_ms']:9.2f}ms")
+    sessions = session_memory(records)
+    if sessions:
+        print(f"artifact bytes per session ({len(sessions)} sessions, top 10)")
+        for session, nbytes in list(sessions.items())[:10]:
+            print(f"  {session or '-':<36} {nbytes / 1e6:9.3f} MB")
+
+
+if __name__ == "__main__":
+    main()
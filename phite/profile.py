@@ -0,0 +1,93 @@
+"""Joined, gene-keyed profile table across all datasets.
+
+The fold changes (``data_url``), baseline stats (``stats_url``), phenotype
+correlations (``corr_url``) and model gene membership (the manifests' gene
+lists) are joined once, at load time, into a single table indexed by gene
+symbol. ``GeneProfiles.lookup`` then returns every facet of a gene from one
+hash lookup and one row read of a dense float array, instead of a scan per
+dataset.
+"""
+import numpy as np
+import pandas as pd
+
+STATS_COLS = ["mean", "min", "max", "std"]
+
+
+def _keyed(df, key, columns):
+    df = df.dropna(subset=[key])
+    index = pd.Index(df[key].astype(str).to_numpy(), dtype=object)
+    out = pd.DataFrame({c: df[c].to_numpy() for c in columns}, index=index)
+    # duplicated symbols keep their first row, as the gene index built at ingestion does
+    return out[~out.index.duplicated(keep="first")]
+
+
+class GeneProfiles:
+    def __init__(self, frame, comparisons, correlation_cols, models):
+        self.frame = frame
+        self.comparisons = comparisons
+        self.correlation_cols = correlation_cols
+        self.models = models
+        self.index = frame.index
+        value_cols = [c for c in frame.columns if frame[c].dtype != bool]
+        flag_cols = [c for c in frame.columns if frame[c].dtype == bool]
+        self._values = frame[value_cols].to_numpy(dtype=np.float64)
+        self._value_pos = {c: i for i, c in enumerate(value_cols)}
+        self._flags = frame[flag_cols].to_numpy()
+        self._flag_pos = {c: i for i, c in enumerate(flag_cols)}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, gene):
+        return gene in self.index
+
+    def _pick(self, values, cols):
+        return [float(values[self._value_pos[c]]) if c in self._value_pos else np.nan for c in cols]
+
+    def lookup(self, gene):
+        """All facets of ``gene`` from one row fetch, or None if no dataset has it."""
+        try:
+            position = self.index.get_loc(gene)
+        except KeyError:
+            return None
+        values, flags = self._values[position], self._flags[position]
+
+        fold_change = None
+        if flags[self._flag_pos["has_fold_change"]]:
+            fold_change = {
+                "comparison": list(self.comparisons),
+                "log2FC": self._pick(values, [f"log2FC_{c}" for c in self.comparisons]),
+                "padj": self._pick(values, [f"padj_{c}" for c in self.comparisons]),
+            }
+        stats = correlations = None
+        if flags[self._flag_pos["has_stats"]]:
+            stats = dict(zip(STATS_COLS, self._pick(values, STATS_COLS)))
+        if flags[self._flag_pos["has_correlations"]]:
+            correlations = dict(zip(self.correlation_cols, self._pick(values, self.correlation_cols)))
+        return {
+            "gene": gene,
+            "fold_change": fold_change,
+            "stats": stats,
+            "correlations": correlations,
+            "models": [m for m in self.models if flags[self._flag_pos[f"in_{m}_model"]]],
+        }
+
+
+def build_profiles(fold_change, stats, correlations, model_genes=None):
+    """Join the three datasets on gene symbol; ``model_genes`` maps model name -> genes."""
+    model_genes = model_genes or {}
+    fc_cols = [c for c in fold_change.columns if c.startswith(("log2FC_", "padj_"))]
+    corr_cols = [c for c in correlations.columns if c.endswith(("_corr", "_p_val"))]
+    parts = [
+        _keyed(fold_change, "genesymbol", fc_cols),
+        _keyed(stats, "Unnamed: 0", STATS_COLS),
+        _keyed(correlations, "Unnamed: 0", corr_cols),
+    ]
+    frame = pd.concat(parts, axis=1, join="outer", sort=False)
+    for name, part in zip(["fold_change", "stats", "correlations"], parts):
+        frame[f"has_{name}"] = frame.index.isin(part.index)
+    for name, genes in model_genes.items():
+        frame[f"in_{name}_model"] = frame.index.isin(list(genes))
+
+    comparisons = [c[len("log2FC_"):] for c in fc_cols if c.startswith("log2FC_")]
+    return GeneProfiles(frame, comparisons, corr_cols, list(model_genes))
@@ -0,0 +1,97 @@
+"""Background execution for progressive page rendering.
+
+Pages draw their cheap elements straight away and hand expensive work
+(figure building, image export) to a shared thread pool. ``st.empty()``
+placeholders reserve the space, and the script thread fills them as the
+futures finish. Worker threads never call Streamlit themselves, not even
+cached loaders; the script thread resolves those and passes the values in.
+
+Streamlit only acts on a stop or rerun request when the script calls into
+it, so the script thread waits in short intervals and makes a cheap
+Streamlit call between them (``as_completed(poll=...)``). Otherwise a user
+typing a new gene would wait for the old gene's figures.
+
+Work is grouped per session and per input (``task_group``). When the input
+changes, for example the user types another gene, the previous group is
+cancelled. Queued tasks are dropped, and running tasks pass
+``group.cancelled`` to ``check`` between stages to stop early.
+"""
+import concurrent.futures
+import os
+import threading
+
+from phite import metrics
+
+MAX_WORKERS = int(os.environ.get("PHITE_RENDER_WORKERS", "4"))
+POLL_INTERVAL = float(os.environ.get("PHITE_RENDER_POLL_INTERVAL", "0.1"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """The process-wide pool shared by every session."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="phite-render")
+        return _executor
+
+
+def check(cancelled):
+    """Raise ``CancelledError`` if ``cancelled`` (a group's event) is set."""
+    if cancelled is not None and cancelled.is_set():
+        raise concurrent.futures.CancelledError()
+
+
+class TaskGroup:
+    def __init__(self, key, pool=None):
+        self.key = key
+        self.cancelled = threading.Event()
+        self.futures = {}
+        self._pool = pool or executor()
+
+    def _call(self, run, name, fn, args, kwargs):
+        check(self.cancelled)
+        # timings reach the log even if the task finishes after the page run
+        with metrics.attach(run, name):
+            return fn(*args, **kwargs)
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Start ``fn`` unless a task called ``name`` already exists in this group."""
+        if name not in self.futures:
+            self.futures[name] = self._pool.submit(self._call, metrics.current_run(), name, fn, args, kwargs)
+        return self.futures[name]
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.futures.values():
+            future.cancel()
+
+    def as_completed(self, names=None, poll=None, interval=POLL_INTERVAL):
+        """Yield ``(name, future)`` for ``names`` (default: all) as they finish.
+
+        Waits at most ``interval`` seconds at a time and calls ``poll()`` in
+        between, e.g. ``placeholder.empty``, so Streamlit can stop the script.
+        """
+        wanted = {self.futures[n]: n for n in (names or self.futures) if n in self.futures}
+        pending = set(wanted)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=interval,
+                                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield wanted[future], future
+            if pending and poll is not None:
+                poll()
+
+
+def task_group(state, slot, key, pool=None):
+    """The group stored at ``state[slot]`` for ``key``; a group for another key is cancelled."""
+    group = state.get(slot)
+    if group is not None and group.key != key:
+        group.cancel()
+        group = None
+    if group is None:
+        group = TaskGroup(key, pool)
+        state[slot] = group
+    return group
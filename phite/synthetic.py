@@ -0,0 +1,133 @@
+"""Synthetic datasets shaped like the app's remote CSVs.
+
+Used by the benchmark and load-test tools so they can run offline. Column
+layouts follow ``data_url`` (fold changes), ``stats_url`` /
+``small_stats_url`` (baseline stats), ``corr_url`` (phenotype
+correlations) and ``counts_url`` / ``samples_url`` (raw counts).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from phite.figures import timepoint_labels
+
+COMPARISONS = [
+    'w0h3_vs_w0pre', 'w0h24_vs_w0pre', 'w12pre_vs_w0pre',
+    'w12h3_vs_w0pre', 'w12h24_vs_w0pre', 'w16rest_vs_w0pre',
+    'w12h3_vs_w12pre', 'w12h24_vs_w12pre', 'w16rest_vs_w12pre',
+    'w0h24_vs_w0h3', 'w12h24_vs_w12h3', 'w16rest_vs_w12h24',
+]
+PHENOTYPES = ["csa", "torque", "contacts", "vo2"]
+
+
+def gene_names(n_genes, extra=()):
+    extra = list(dict.fromkeys(extra))
+    filler = [f"GENE{i:06d}" for i in range(max(n_genes - len(extra), 0))]
+    return extra + filler
+
+
+def fold_change(genes, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(genes)
+    df = pd.DataFrame({
+        "Unnamed: 0": [f"ENSG{i:011d}" for i in range(n)],
+        "genesymbol": genes,
+    })
+    for comp in COMPARISONS:
+        df[f"log2FC_{comp}"] = rng.normal(0, 1, n)
+    for comp in COMPARISONS:
+        df[f"padj_{comp}"] = rng.uniform(0, 1, n) ** 4
+    return df
+
+
+def stats(genes, seed=0):
+    rng = np.random.default_rng(seed)
+    mean = rng.lognormal(3, 1.5, len(genes))
+    std = mean * rng.uniform(0.1, 0.5, len(genes))
+    return pd.DataFrame({
+        "Unnamed: 0": genes,
+        "mean": mean,
+        "min": np.maximum(mean - 2 * std, 0),
+        "max": mean + 2 * std,
+        "std": std,
+    })
+
+
+def correlations(genes, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Unnamed: 0": genes})
+    for m in PHENOTYPES:
+        df[f"{m}_corr"] = rng.uniform(-1, 1, len(genes))
+        df[f"{m}_p_val"] = rng.uniform(0, 1, len(genes))
+    return df
+
+
+def counts(genes, subjects=8, de_fraction=0.1, seed=0):
+    """Negative binomial raw counts for every timepoint, and the sample sheet.
+
+    ``de_fraction`` of the genes get a random log2 fold change at each
+    timepoint after ``w0pre``; the rest only vary by sequencing depth.
+    """
+    rng = np.random.default_rng(seed)
+    timepoints = list(timepoint_labels)
+    n = len(genes)
+    base = rng.lognormal(4, 2, n)
+    dispersion = 0.05 + 1 / np.maximum(base, 1)
+    effect = np.zeros((n, len(timepoints)))
+    changed = rng.random(n) < de_fraction
+    effect[changed, 1:] = rng.normal(0, 1.5, (changed.sum(), len(timepoints) - 1))
+
+    sheet = pd.DataFrame(
+        [(f"S{s:02d}_{tp}", tp) for s in range(subjects) for tp in timepoints],
+        columns=["sample", "timepoint"],
+    )
+    column = np.array([timepoints.index(tp) for tp in sheet["timepoint"]])
+    depth = rng.lognormal(0, 0.3, len(sheet))
+    mu = base[:, None] * 2 ** effect[:, column] * depth
+    size = 1 / dispersion[:, None]
+    values = rng.negative_binomial(size, size / (size + mu))
+
+    df = pd.DataFrame(values, columns=sheet["sample"])
+    df.insert(0, "genesymbol", genes)
+    return df, sheet
+
+
+def model_features(model):
+    """Gene columns a stacked prediction model actually reads."""
+    features = []
+    for estimator in model.estimators_:
+        select = estimator.steps[0][1]
+        for _, transformer, columns in select.transformers:
+            if transformer != "drop":
+                features.extend(list(columns))
+    return list(dict.fromkeys(features))
+
+
+def write_all(out_dir, n_genes, extra_genes=(), seed=0):
+    """Write data/stats/corr CSVs into ``out_dir`` and return secrets-style URLs."""
+    os.makedirs(out_dir, exist_ok=True)
+    genes = gene_names(n_genes, extra_genes)
+    paths = {
+        "data_url": os.path.join(out_dir, "data.csv"),
+        "stats_url": os.path.join(out_dir, "stats.csv"),
+        "small_stats_url": os.path.join(out_dir, "stats.csv"),
+        "corr_url": os.path.join(out_dir, "corr.csv"),
+    }
+    fold_change(genes, seed).to_csv(paths["data_url"], index=False)
+    stats(genes, seed).to_csv(paths["stats_url"], index=False)
+    correlations(genes, seed).to_csv(paths["corr_url"], index=False)
+    return paths
+
+
+def write_counts(out_dir, genes, subjects=8, seed=0):
+    """Write raw counts and the sample sheet into ``out_dir``; return their URLs."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        "counts_url": os.path.join(out_dir, "counts.csv"),
+        "samples_url": os.path.join(out_dir, "samples.csv"),
+    }
+    df, sheet = counts(genes, subjects, seed=seed)
+    df.to_csv(paths["counts_url"], index=False)
+    sheet.to_csv(paths["samples_url"], index=False)
+    return paths
@@ -0,0 +1,220 @@
+"""Offline retraining with nested cross-validation and a parallel model search.
+
+Rebuilds the stacked model the prediction pages ship: two
+``RandomForestRegressor`` branches, one on the genes most correlated with
+the outcome and one on the genes ranked by ``ExtraTreesRegressor``
+importance, combined by an ``ElasticNet``. Gene selection runs inside every
+training fold, so the out-of-fold predictions are an honest estimate.
+
+Every (outer fold, parameter set, inner fold) fit is independent. They are
+all handed to one joblib process pool, so the search uses every core::
+
+    python -m phite.training counts.csv outcomes.csv --target power_change \\
+        --out power_predict.joblib --units W/kg --n-jobs -1
+
+Writes the fitted ``.joblib``, its compact ``.npz`` export (``phite.serving``)
+and a ``.manifest.json`` (``phite.manifest``) that the pages read for the
+validation plot, the R² label and the list of input genes.
+
+``counts.csv`` holds baseline normalized counts (DESeq2
+``counts(normalized = TRUE)``). Genes can be rows (first column = gene id,
+one column per sample) or columns (first column = sample id).
+``outcomes.csv`` has a sample id column (``--sample-col``) and the target.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor, StackingRegressor
+from sklearn.feature_selection import f_regression
+from sklearn.linear_model import ElasticNet
+from sklearn.model_selection import KFold, ParameterGrid
+from sklearn.pipeline import Pipeline
+
+from phite import manifest, serving
+
+SEED = 10
+DEFAULT_GRID = {
+    "k_corr": [15, 30],
+    "k_etr": [30, 50],
+    "alpha": [0.1, 0.5],
+    "l1_ratio": [0.3],
+}
+
+
+def load_training_data(counts_path, outcomes_path, target, sample_col="sample"):
+    """Return ``(X, y)`` with one row per sample and one column per gene."""
+    counts = pd.read_csv(counts_path, index_col=0)
+    outcomes = pd.read_csv(outcomes_path).set_index(sample_col)[target].dropna()
+    outcomes.index = outcomes.index.astype(str)
+    counts.index = counts.index.astype(str)
+    counts.columns = counts.columns.astype(str)
+
+    if outcomes.index.isin(counts.columns).sum() > outcomes.index.isin(counts.index).sum():
+        counts = counts.T
+    samples = outcomes.index[outcomes.index.isin(counts.index)]
+    if len(samples) < 4:
+        raise ValueError(f"only {len(samples)} samples appear in both {counts_path} and {outcomes_path}")
+
+    X = counts.loc[samples].astype(np.float64)
+    X = X.loc[:, X.var() > 0]
+    return X, outcomes.loc[samples].to_numpy(dtype=np.float64)
+
+
+def select_by_correlation(X, y, k):
+    scores, _ = f_regression(X, y)
+    order = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind="stable")
+    return list(X.columns[order[:k]])
+
+
+def select_by_importance(X, y, k, seed=SEED):
+    forest = ExtraTreesRegressor(n_estimators=200, random_state=seed, n_jobs=1).fit(X, y)
+    order = np.argsort(-forest.feature_importances_, kind="stable")
+    return list(X.columns[order[:k]])
+
+
+def _branch(genes, seed):
+    return Pipeline(steps=[
+        ("select", ColumnTransformer(transformers=[("sel", "passthrough", genes)])),
+        ("reg", RandomForestRegressor(random_state=seed, n_jobs=1)),
+    ])
+
+
+def build_model(X, y, params, seed=SEED):
+    """Select genes on ``(X, y)`` and fit the stacked model with ``params``."""
+    corr_genes = select_by_correlation(X, y, params["k_corr"])
+    etr_genes = select_by_importance(X, y, params["k_etr"], seed)
+    model = StackingRegressor(
+        estimators=[("rf_k", _branch(corr_genes, seed)), ("rf_etr", _branch(etr_genes, seed))],
+        final_estimator=ElasticNet(alpha=params["alpha"], l1_ratio=params["l1_ratio"], random_state=seed),
+        cv=3,
+    )
+    return model.fit(X, y)
+
+
+def _fit_predict(X, y, train, test, params, seed):
+    model = build_model(X.iloc[train], y[train], params, seed)
+    return test, model.predict(X.iloc[test])
+
+
+def _pooled_r2(y, chunks):
+    index = np.concatenate([test for test, _ in chunks])
+    predicted = np.concatenate([pred for _, pred in chunks])
+    return manifest.r2(y[index], predicted)
+
+
+def _inner_tasks(train, combos, inner_folds, seed):
+    inner = KFold(inner_folds, shuffle=True, random_state=seed)
+    for ci, params in enumerate(combos):
+        for inner_train, inner_test in inner.split(train):
+            yield ci, params, train[inner_train], train[inner_test]
+
+
+def nested_cv(X, y, grid=None, outer_folds=5, inner_folds=3, n_jobs=-1, seed=SEED, verbose=0):
+    """Out-of-fold predictions with the parameters picked by an inner search in each fold."""
+    combos = list(ParameterGrid(grid or DEFAULT_GRID))
+    outer = list(KFold(outer_folds, shuffle=True, random_state=seed).split(X))
+    parallel = Parallel(n_jobs=n_jobs, backend="loky", verbose=verbose)
+
+    tasks = [(oi, ci, params, tr, te)
+             for oi, (train, _) in enumerate(outer)
+             for ci, params, tr, te in _inner_tasks(train, combos, inner_folds, seed)]
+    results = parallel(delayed(_fit_predict)(X, y, tr, te, params, seed) for _, _, params, tr, te in tasks)
+
+    chunks = {}
+    for (oi, ci, _, _, _), result in zip(tasks, results):
+        chunks.setdefault((oi, ci), []).append(result)
+    best = [max(range(len(combos)), key=lambda ci: _pooled_r2(y, chunks[(oi, ci)])) for oi in range(len(outer))]
+
+    refits = parallel(delayed(_fit_predict)(X, y, train, test, combos[best[oi]], seed)
+                      for oi, (train, test) in enumerate(outer))
+    predicted = np.empty_like(y)
+    for test, pred in refits:
+        predicted[test] = pred
+    return predicted, [combos[ci] for ci in best]
+
+
+def search(X, y, grid=None, folds=3, n_jobs=-1, seed=SEED, verbose=0):
+    """Cross-validated R² for every parameter set on the full data; returns ``(best, scores)``."""
+    combos = list(ParameterGrid(grid or DEFAULT_GRID))
+    tasks = list(_inner_tasks(np.arange(len(y)), combos, folds, seed))
+    results = Parallel(n_jobs=n_jobs, backend="loky", verbose=verbose)(
+        delayed(_fit_predict)(X, y, tr, te, params, seed) for _, params, tr, te in tasks
+    )
+    chunks = {}
+    for (ci, _, _, _), result in zip(tasks, results):
+        chunks.setdefault(ci, []).append(result)
+    scores = [{"params": combos[ci], "r2": _pooled_r2(y, chunks[ci])} for ci in range(len(combos))]
+    best = max(scores, key=lambda s: s["r2"])["params"]
+    return best, scores
+
+
+def train(X, y, out, target, units="", grid=None, outer_folds=5, inner_folds=3, n_jobs=-1, seed=SEED, verbose=0):
+    predicted, fold_params = nested_cv(X, y, grid, outer_folds, inner_folds, n_jobs, seed, verbose)
+    best, scores = search(X, y, grid, inner_folds, n_jobs, seed, verbose)
+    model = build_model(X, y, best, seed)
+
+    joblib.dump(model, out)
+    compact_path = os.path.splitext(out)[0] + ".npz"
+    serving.export(model, compact_path)
+    compact = serving.load(compact_path)
+    parity = serving.check_parity(model, compact, X[compact.features].to_numpy())
+
+    order = np.argsort(y, kind="stable")
+    doc = {
+        "target": target,
+        "units": units,
+        "model": os.path.basename(out),
+        "compact_model": os.path.basename(compact_path),
+        "trained_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "n_samples": int(len(y)),
+        "params": best,
+        "genes": sorted(compact.features),
+        "validation": {
+            "method": f"nested cross-validation ({outer_folds} outer x {inner_folds} inner folds)",
+            "r2": manifest.r2(y, predicted),
+            "predicted": predicted[order].tolist(),
+            "observed": y[order].tolist(),
+            "fold_params": fold_params,
+            "search": scores,
+        },
+        "compact_parity_max_abs_error": parity,
+    }
+    manifest.write(manifest.path_for(out), doc)
+    return doc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("counts", help="baseline normalized counts CSV")
+    parser.add_argument("outcomes", help="per-sample outcomes CSV")
+    parser.add_argument("--target", required=True, help="outcome column to predict")
+    parser.add_argument("--sample-col", default="sample")
+    parser.add_argument("--out", required=True, help="destination .joblib")
+    parser.add_argument("--units", default="")
+    parser.add_argument("--grid", help="JSON parameter grid, defaults to " + json.dumps(DEFAULT_GRID))
+    parser.add_argument("--outer-folds", type=int, default=5)
+    parser.add_argument("--inner-folds", type=int, default=3)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--verbose", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    X, y = load_training_data(args.counts, args.outcomes, args.target, args.sample_col)
+    grid = json.loads(args.grid) if args.grid else None
+    doc = train(X, y, args.out, args.target, args.units, grid, args.outer_folds, args.inner_folds,
+                args.n_jobs, args.seed, args.verbose)
+    print(f"{args.out}: {doc['n_samples']} samples, {len(doc['genes'])} genes, "
+          f"nested CV R² = {doc['validation']['r2']:.3f}, params {doc['params']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+from phite import artifacts
+
+
+def test_value_over_the_session_cap_is_refused():
+    store = artifacts.ArtifactStore(max_bytes=1000, session_max_bytes=100)
+    assert store.put("s", b"x", size=101) is None
+    assert store.stats("s")["session_bytes"] == 0
+
+
+def test_session_cap_evicts_its_oldest_entries():
+    store = artifacts.ArtifactStore(max_bytes=1000, session_max_bytes=100)
+    first = store.put("s", "first", size=60)
+    other = store.put("t", "other", size=60)
+    second = store.put("s", "second", size=60)
+    assert store.get("s", first) is None
+    assert store.get("s", second) == "second"
+    assert store.get("t", other) == "other"
+    assert store.stats()["evictions"] == 1
@@ -0,0 +1,36 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from phite import browse
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "gene": pd.Categorical(["B", None, "A", "C"]),
+        "x": [2.0, 1.0, np.nan, 3.0],
+        "note": ["b", "a", None, "c"],
+    })
+
+
+@pytest.mark.parametrize("column", ["gene", "x", "note"])
+@pytest.mark.parametrize("ascending", [True, False])
+def test_missing_values_sort_last(df, column, ascending):
+    rows = browse.positions(df, browse.Query(sort_by=column, ascending=ascending))
+    values = df[column].take(rows)
+    n_missing = int(values.isna().sum())
+    assert n_missing == 1
+    assert values.iloc[-1:].isna().all()
+    present = values.iloc[:-1].tolist()
+    assert present == sorted(present, reverse=not ascending)
+
+
+def test_export_file_round_trips(df):
+    rows = np.array([3, 0])
+    with browse.export_file(df, rows, "csv", chunk_rows=1) as f:
+        assert pd.read_csv(io.BytesIO(f.read()))["x"].tolist() == [3.0, 2.0]
+    with browse.export_file(df, rows, "parquet", chunk_rows=1) as f:
+        assert pd.read_parquet(io.BytesIO(f.read()))["note"].tolist() == ["c", "b"]
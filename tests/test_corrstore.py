@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from phite import corrstore
+
+
+def test_pvalue_codes_round_trip_and_keep_nan():
+    p = np.array([1.0, 0.05, 1e-300, 0.0, np.nan])
+    back = corrstore.dequantize_p(corrstore.quantize_p(p))
+    assert np.allclose(back[:2], p[:2], rtol=3e-3)
+    assert back[2] == back[3] == 10.0 ** -corrstore.MAX_LOGP
+    assert np.isnan(back[4])
+
+
+def test_missing_pvalue_reads_back_as_nan(tmp_path):
+    df = pd.DataFrame({
+        "Unnamed: 0": ["A", "B"],
+        "vo2_corr": [0.5, -0.25],
+        "vo2_p_val": [np.nan, 0.01],
+    })
+    store = corrstore.CorrStore(corrstore.from_table(df, str(tmp_path / "store")))
+    assert np.isnan(store.row("A")["p"].iloc[0])
+    assert np.isnan(store.dense_row("A").loc["vo2", "p"])
+    assert store.row("B")["p"].iloc[0] == np.float64(10.0 ** -2)
@@ -0,0 +1,94 @@
+import http.server
+import os
+import threading
+
+import pytest
+
+from phite import datasets
+
+CSV = "genesymbol,log2FC_w0h3_vs_w0pre\nPPARD,1.5\nG1,-0.25\n"
+CHANGED = "genesymbol,log2FC_w0h3_vs_w0pre\nPPARD,2.5\nG1,-0.25\nG2,0.75\n"
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    statuses = None
+
+    def log_request(self, code="-", size="-"):
+        self.statuses.append(int(code))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "www"
+    root.mkdir()
+    statuses = []
+    handler = type("Handler", (_Handler,), {"statuses": statuses})
+    httpd = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), lambda *args, **kwargs: handler(*args, directory=str(root), **kwargs))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{httpd.server_address[1]}", statuses
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+def test_revalidates_with_conditional_requests(server, tmp_path):
+    root, base, statuses = server
+    cache_dir = str(tmp_path / "cache")
+    _write(root / "data.csv", CSV, 1_700_000_000)
+    url = f"{base}/data.csv"
+
+    first = datasets.read_csv(url, key="genesymbol", cache_dir=cache_dir)
+    assert statuses == [200]
+    assert first["genesymbol"].tolist() == ["PPARD", "G1"]
+
+    second = datasets.read_csv(url, key="genesymbol", cache_dir=cache_dir)
+    assert statuses == [200, 304]
+    assert second.equals(first)
+
+    _write(root / "data.csv", CHANGED, 1_700_000_100)
+    third = datasets.read_csv(url, key="genesymbol", cache_dir=cache_dir)
+    assert statuses == [200, 304, 200]
+    assert third["genesymbol"].tolist() == ["PPARD", "G1", "G2"]
+    genes = datasets.read_genes(url, ["G2", "missing", "PPARD"], key="genesymbol", cache_dir=cache_dir)
+    assert genes.index.tolist() == ["G2", "PPARD"]
+
+
+def test_http_error_serves_cached_copy_with_warning(server, tmp_path):
+    root, base, statuses = server
+    cache_dir = str(tmp_path / "cache")
+    _write(root / "data.csv", CSV, 1_700_000_000)
+    url = f"{base}/data.csv"
+    datasets.read_csv(url, key="genesymbol", cache_dir=cache_dir)
+
+    os.remove(root / "data.csv")
+    with pytest.warns(UserWarning, match="HTTP 404"):
+        df = datasets.read_csv(url, key="genesymbol", cache_dir=cache_dir)
+    assert df["genesymbol"].tolist() == ["PPARD", "G1"]
+
+
+def test_http_error_without_cache_raises(server, tmp_path):
+    _, base, _ = server
+    with pytest.raises(datasets.urllib.error.HTTPError):
+        datasets.read_csv(f"{base}/missing.csv", cache_dir=str(tmp_path / "cache"))
+
+
+def test_dtype_is_applied_and_part_of_the_cache(tmp_path):
+    path = tmp_path / "samples.csv"
+    path.write_text("sample,count\n100,16777217\n101,3\n")
+    cache_dir = str(tmp_path / "cache")
+
+    as_text = datasets.read_csv(str(path), cache_dir=cache_dir, dtype={"sample": "string"})
+    assert as_text["sample"].astype(str).tolist() == ["100", "101"]
+    assert as_text["count"].tolist() == [16777217, 3]
+
+    as_numbers = datasets.read_csv(str(path), cache_dir=cache_dir)
+    assert as_numbers["sample"].tolist() == [100, 101]
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from phite import diffexp, synthetic
+
+
+def test_size_factors_median_of_ratios():
+    counts = np.array([[1, 4],
+                       [2, 2],
+                       [3, 12],
+                       [0, 7]])  # a zero count leaves the gene out
+    # geometric means 2, 2, 6; ratios per sample (0.5, 1, 0.5) and (2, 1, 2)
+    np.testing.assert_allclose(diffexp.size_factors(counts), [0.5, 2.0])
+
+    with pytest.raises(ValueError):
+        diffexp.size_factors(np.array([[0, 1], [1, 0]]))
+
+
+def test_adjust_pvalues_benjamini_hochberg():
+    padj = diffexp.adjust_pvalues([0.01, 0.04, 0.03, 0.005, np.nan])
+    np.testing.assert_allclose(padj, [0.02, 0.04, 0.04, 0.02, np.nan])
+
+    padj = diffexp.adjust_pvalues([0.01, 0.02, 0.03, 0.5, np.nan, 0.9])
+    np.testing.assert_allclose(padj, [0.05, 0.05, 0.05, 0.625, np.nan, 0.9])
+    assert np.isnan(diffexp.adjust_pvalues([np.nan])).all()
+
+
+def _true_log2fc(n, numerator, denominator, de_fraction=0.1, seed=0):
+    # replays the draws synthetic.counts makes for its fold changes
+    rng = np.random.default_rng(seed)
+    timepoints = list(synthetic.timepoint_labels)
+    rng.lognormal(4, 2, n)
+    effect = np.zeros((n, len(timepoints)))
+    changed = rng.random(n) < de_fraction
+    effect[changed, 1:] = rng.normal(0, 1.5, (changed.sum(), len(timepoints) - 1))
+    return effect[:, timepoints.index(numerator)] - effect[:, timepoints.index(denominator)], changed
+
+
+def test_compare_on_synthetic_counts():
+    genes = [f"G{i}" for i in range(2000)]
+    data = diffexp.CountData.from_frames(*synthetic.counts(genes, seed=0))
+    res = diffexp.compare(data, "w12pre", "w0pre")
+    truth, changed = _true_log2fc(len(genes), "w12pre", "w0pre")
+
+    # unchanged genes: p-values close to uniform
+    null = res["pvalue"].to_numpy()[~changed]
+    null = null[~np.isnan(null)]
+    assert (null < 0.05).mean() < 0.05
+
+    # changed genes with enough counts: fold changes recovered
+    fit = changed & (res["baseMean"].to_numpy() > 10) & res["log2FoldChange"].notna().to_numpy()
+    assert np.corrcoef(res["log2FoldChange"].to_numpy()[fit], truth[fit])[0, 1] > 0.95
@@ -0,0 +1,48 @@
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from phite import ingest
+
+
+def _ingest(tmp_path, text, chunksize=2):
+    dest = str(tmp_path / "data.parquet")
+    n = ingest.csv_to_parquet(io.StringIO(text), dest, key="genesymbol", chunksize=chunksize)
+    return dest, n
+
+
+def test_types_widen_across_chunks(tmp_path):
+    text = ("genesymbol,note,count,flag,score,padj_a\n"
+            "A,,1,True,1,0.5\n"
+            "B,,2,False,2,0.01\n"
+            "C,late text,3,True,2.5,1e-300\n"
+            "D,,4,,3,\n")
+    dest, n = _ingest(tmp_path, text)
+    assert n == 4
+
+    schema = pq.read_schema(dest)
+    assert pa.types.is_dictionary(schema.field("note").type)
+    assert schema.field("count").type == pa.int64()
+    assert schema.field("flag").type == pa.bool_()
+    assert schema.field("score").type == pa.float32()
+    assert schema.field("padj_a").type == pa.float64()
+
+    df = ingest.pd.read_parquet(dest)
+    assert df["note"].tolist()[2] == "late text"
+    assert df["count"].tolist() == [1, 2, 3, 4]
+    assert df["padj_a"].iloc[2] == 1e-300
+    assert ingest.read_index(dest)["D"] == 3
+
+
+def test_large_integers_keep_precision(tmp_path):
+    dest, _ = _ingest(tmp_path, "genesymbol,count\nA,16777217\nB,\nC,3\n")
+    assert ingest.pd.read_parquet(dest)["count"].iloc[0] == 16777217
+
+
+def test_read_rows_in_requested_order(tmp_path):
+    text = "genesymbol,x\n" + "".join(f"G{i},{i}\n" for i in range(7))
+    dest, _ = _ingest(tmp_path, text)
+    df = ingest.read_rows(dest, [5, 0, 3, 6])
+    assert df["genesymbol"].tolist() == ["G5", "G0", "G3", "G6"]
+    assert df["x"].tolist() == [5, 0, 3, 6]
@@ -0,0 +1,29 @@
+import pytest
+
+from phite import metrics
+
+
+def test_page_run_is_written_when_the_script_stops_early(tmp_path, monkeypatch):
+    path = str(tmp_path / "metrics.jsonl")
+    monkeypatch.setattr(metrics, "METRICS_FILE", path)
+
+    with pytest.raises(RuntimeError):
+        with metrics.page_run("page"):
+            with metrics.timer("step"):
+                pass
+            raise RuntimeError("rerun")
+
+    [record] = metrics.read(path)
+    assert record["page"] == "page"
+    assert record["calls"] == {"step": 1}
+    assert metrics.current_run() is None
+
+
+def test_write_rotates_past_the_size_cap(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    for page in "abcde":
+        metrics.write(metrics.Run(page), path, max_bytes=1, backups=2)
+
+    # every write rotates; the two newest backups and the current file remain
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["metrics.jsonl", "metrics.jsonl.1", "metrics.jsonl.2"]
+    assert [r["page"] for r in metrics.read(path, backups=2)] == ["c", "d", "e"]
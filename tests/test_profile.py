@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from phite import profile
+
+
+def _profiles():
+    fold_change = pd.DataFrame({
+        "genesymbol": ["A", "B", "A"],  # A is duplicated; its first row wins
+        "log2FC_w4": [1.0, 2.0, 9.0],
+        "padj_w4": [0.01, 0.5, 0.9],
+        "note": ["x", "y", "z"],
+    })
+    stats = pd.DataFrame({"Unnamed: 0": ["B", "C"], "mean": [5.0, 6.0], "min": [1.0, 2.0],
+                          "max": [9.0, 10.0], "std": [1.5, 2.5]})
+    correlations = pd.DataFrame({"Unnamed: 0": ["A", "C"], "csa_corr": [0.3, -0.2], "csa_p_val": [0.04, 0.2]})
+    return profile.build_profiles(fold_change, stats, correlations, {"power": ["B"], "vo2": ["B", "C"]})
+
+
+def test_outer_join_keeps_genes_missing_from_some_datasets():
+    profiles = _profiles()
+    assert sorted(profiles.index) == ["A", "B", "C"]
+
+    a = profiles.lookup("A")
+    assert a["fold_change"] == {"comparison": ["w4"], "log2FC": [1.0], "padj": [0.01]}
+    assert a["stats"] is None
+    assert a["correlations"] == {"csa_corr": 0.3, "csa_p_val": 0.04}
+
+    c = profiles.lookup("C")
+    assert c["fold_change"] is None
+    assert c["stats"] == {"mean": 6.0, "min": 2.0, "max": 10.0, "std": 2.5}
+
+
+def test_model_membership_flags():
+    profiles = _profiles()
+    assert profiles.lookup("A")["models"] == []
+    assert profiles.lookup("B")["models"] == ["power", "vo2"]
+    assert profiles.lookup("C")["models"] == ["vo2"]
+
+
+def test_missing_gene():
+    profiles = _profiles()
+    assert "D" not in profiles
+    assert profiles.lookup("D") is None
+    assert len(profiles) == 3
+
+
+def test_missing_values_are_nan():
+    stats = pd.DataFrame({"Unnamed: 0": ["A"], "mean": [np.nan], "min": [1.0], "max": [2.0], "std": [0.5]})
+    empty = pd.DataFrame({"genesymbol": [], "Unnamed: 0": []})
+    profiles = profile.build_profiles(empty, stats, empty)
+    assert np.isnan(profiles.lookup("A")["stats"]["mean"])
+    assert profiles.lookup("A")["models"] == []
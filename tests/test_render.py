@@ -0,0 +1,63 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from phite import metrics, render
+
+
+def test_as_completed_polls_while_waiting():
+    release = threading.Event()
+    group = render.TaskGroup("key")
+    group.submit("slow", release.wait)
+    polls = []
+
+    def poll():
+        polls.append(1)
+        if len(polls) == 3:
+            release.set()
+
+    assert [name for name, _ in group.as_completed(poll=poll, interval=0.01)] == ["slow"]
+    assert len(polls) >= 3
+
+
+def test_new_key_cancels_running_task_between_stages():
+    state = {}
+    started, proceed = threading.Event(), threading.Event()
+
+    def task(cancelled):
+        started.set()
+        proceed.wait()
+        render.check(cancelled)
+        return "finished"
+
+    group = render.task_group(state, "slot", "a")
+    future = group.submit("work", task, group.cancelled)
+    started.wait()
+    assert render.task_group(state, "slot", "b") is not group
+    proceed.set()
+    with pytest.raises(concurrent.futures.CancelledError):
+        future.result()
+
+
+def test_task_finishing_after_its_run_is_still_logged(tmp_path, monkeypatch):
+    path = str(tmp_path / "metrics.jsonl")
+    monkeypatch.setattr(metrics, "METRICS_FILE", path)
+    release = threading.Event()
+
+    @metrics.timer("slow_step")
+    def slow():
+        release.wait()
+
+    group = render.TaskGroup("key")
+    with metrics.page_run("page"):
+        future = group.submit("export", slow)
+        with metrics.timer("fast_step"):
+            pass
+    release.set()
+    future.result()
+
+    page, late = metrics.read(path)
+    assert page["timings_s"].keys() == {"fast_step"}
+    assert late["page"] == "page" and late["task"] == "export"
+    assert late["calls"] == {"slow_step": 1}
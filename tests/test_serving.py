@@ -0,0 +1,21 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+from phite import serving
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("name", ["power_predict", "vo2_predict"])
+def test_exported_model_matches_sklearn(tmp_path, name):
+    model = joblib.load(os.path.join(ROOT, f"{name}.joblib"))
+    compact = serving.load(serving.export(model, str(tmp_path / f"{name}.npz")))
+
+    # more rows than one chunk, with a few missing values
+    X = serving.random_inputs(compact, serving.CHUNK_ROWS * 2 + 17)
+    X[::50, 0] = np.nan
+    assert serving.check_parity(model, compact, X) < 1e-9
+    assert serving.check_parity(model, compact, X[:1]) < 1e-9